@@ -0,0 +1,274 @@
+"""
+ASGI config for foodstock project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+Django 2.0 has neither an ASGI handler nor async views, so the event loop owns the
+connections, reads the request bodies and sends the responses while the Django
+application runs on bounded thread pools. A request only takes a worker thread once
+its body is read, and a slow reader holds the thread only while its response does not
+fit in the buffered chunks. A client disconnecting stops the worker at its next chunk.
+Authentication endpoints get their own pool so login spikes can't take the threads
+serving the inventory.
+
+Responses may also hand their content over to the event loop, see
+inventory.responses.AsyncContentResponse: the long-polls and event streams of the
+changes endpoint release their thread once the request is authenticated and wait on
+the event loop. They get their own pool too, for the renderers that still wait on it.
+
+Run it with any ASGI server, e.g.:
+$ pip install uvicorn
+$ uvicorn foodstock.asgi:application --workers 4
+
+Pool sizes are set with the FOODSTOCK_ASGI_THREADS, FOODSTOCK_ASGI_AUTH_THREADS and
+FOODSTOCK_ASGI_CHANGES_THREADS environment variables.
+"""
+
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "foodstock.settings")
+
+
+class ClientDisconnected(Exception):
+    """
+    Raised on the worker thread when the client went away before the response was sent
+    """
+
+
+class ThreadPoolASGIHandler(object):
+    """
+    ASGI 3 application running a WSGI application on thread pools selected by path prefix
+    Each request stays on a single thread since Django's database connections are per thread
+    """
+
+    # Number of response chunks buffered between the worker thread and the event loop
+    queue_size = 8
+
+    def __init__(self, wsgi_application, default_pool, prefix_pools=None):
+        self.wsgi_application = wsgi_application
+        self.default_pool = default_pool
+        self.prefix_pools = prefix_pools or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError("Unsupported ASGI scope type: {}".format(scope['type']))
+
+        body = await self.read_body(receive)
+        if body is None:
+            return
+
+        # Set once the response is over, streaming views can stop early when the client is gone
+        disconnected = threading.Event()
+        environ = self.get_environ(scope, body)
+        environ['foodstock.disconnected'] = disconnected
+        environ['foodstock.async_content'] = True
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        worker = loop.run_in_executor(self.get_pool(scope['path']), self.run_wsgi, environ, loop, queue, disconnected)
+        watcher = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        completed = False
+        try:
+            completed = await self.send_response(queue, watcher, send)
+        finally:
+            disconnected.set()
+            watcher.cancel()
+            await self.drain(queue, worker)
+        if completed:
+            worker.result()
+        elif not worker.cancelled():
+
+            # The worker stopped on ClientDisconnected or failed for a client that is gone
+            worker.exception()
+
+    async def send_response(self, queue, watcher, send):
+        """
+        Send the response handed over by the worker, returns False if the client disconnected first
+        """
+        started = False
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait([getter, watcher], return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                return False
+            kind, value = getter.result()
+            if kind == 'start':
+                started = True
+                await send({'type': 'http.response.start', 'status': value[0], 'headers': value[1]})
+            elif kind == 'body':
+                await send({'type': 'http.response.body', 'body': value, 'more_body': True})
+            elif kind == 'async':
+                if not await self.send_async_content(value, watcher, send):
+                    return False
+            else:
+                break
+
+        if not started:
+            await send({'type': 'http.response.start', 'status': 500, 'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return True
+
+    @staticmethod
+    async def send_async_content(async_content, watcher, send):
+        """
+        Send the content produced on the event loop, returns False if the client disconnected first
+        """
+        chunks = async_content().__aiter__()
+        while True:
+            getter = asyncio.ensure_future(chunks.__anext__())
+            await asyncio.wait([getter, watcher], return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                return False
+            try:
+                chunk = getter.result()
+            except StopAsyncIteration:
+                return True
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+    @staticmethod
+    async def drain(queue, worker):
+        """
+        Discard the chunks of the worker until it is done so it never waits on a full queue
+        """
+        while not worker.done():
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait([getter, worker], return_when=asyncio.FIRST_COMPLETED)
+            getter.cancel()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def get_pool(self, path):
+        for prefix, pool in self.prefix_pools.items():
+            if path.startswith(prefix):
+                return pool
+        return self.default_pool
+
+    @staticmethod
+    async def read_body(receive):
+        """
+        Returns the request body, None if the client disconnected before sending all of it
+        """
+        body = b''
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body += message.get('body', b'')
+            if not message.get('more_body', False):
+                return body
+
+    @staticmethod
+    async def wait_for_disconnect(receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+    @staticmethod
+    def get_environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            # WSGI carries the path as latin-1 decoded bytes
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'REMOTE_ADDR': client[0],
+            'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            if name in environ:
+                value = environ[name] + ',' + value
+            environ[name] = value
+        return environ
+
+    def run_wsgi(self, environ, loop, queue, disconnected):
+        """
+        Run the WSGI application on the worker thread, handing the response to the event loop
+        """
+        def put(kind, value=None):
+            if disconnected.is_set():
+                raise ClientDisconnected()
+
+            # Waits while the queue is full so a slow client bounds the buffered chunks
+            asyncio.run_coroutine_threadsafe(queue.put((kind, value)), loop).result()
+
+        start = {}
+
+        def start_response(status, headers, exc_info=None):
+            start['status'] = int(status.split(' ', 1)[0])
+            start['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+            return lambda data: put('body', data)
+
+        response = None
+        try:
+            response = self.wsgi_application(environ, start_response)
+            async_content = getattr(response, 'async_content', None)
+            if async_content is not None:
+
+                # The content is produced by the event loop once this thread is released
+                put('start', (start['status'], start['headers']))
+                put('async', async_content)
+                return
+            started = False
+            for chunk in response:
+                if not started:
+                    put('start', (start['status'], start['headers']))
+                    started = True
+                if chunk:
+                    put('body', chunk)
+            if not started:
+                put('start', (start['status'], start['headers']))
+        finally:
+            try:
+
+                # Closes streaming responses and their generators, then finishes the request
+                if hasattr(response, 'close'):
+                    response.close()
+            finally:
+                if not disconnected.is_set():
+                    put('end')
+
+
+application = ThreadPoolASGIHandler(
+    get_wsgi_application(),
+    ThreadPoolExecutor(int(os.environ.get('FOODSTOCK_ASGI_THREADS', 32)), thread_name_prefix='asgi'),
+    {
+        '/inventory/auth/': ThreadPoolExecutor(int(os.environ.get('FOODSTOCK_ASGI_AUTH_THREADS', 4)), thread_name_prefix='asgi-auth'),
+        '/inventory/food/changes': ThreadPoolExecutor(
+            int(os.environ.get('FOODSTOCK_ASGI_CHANGES_THREADS', 64)), thread_name_prefix='asgi-changes'
+        ),
+    },
+)
@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'inventory.instrumentation.InstrumentationMiddleware',
+    'inventory.hashers.PasswordHashingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,14 +78,64 @@ WSGI_APPLICATION = 'foodstock.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/2.0/ref/settings/#databases
+# FOODSTOCK_DB_ENGINE selects the profile: sqlite (default) or postgresql
+
+DATABASE_PROFILE = os.environ.get('FOODSTOCK_DB_ENGINE', 'sqlite')
+
+if DATABASE_PROFILE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('FOODSTOCK_DB_NAME', 'foodstock'),
+            'USER': os.environ.get('FOODSTOCK_DB_USER', ''),
+            'PASSWORD': os.environ.get('FOODSTOCK_DB_PASSWORD', ''),
+            'HOST': os.environ.get('FOODSTOCK_DB_HOST', ''),
+            'PORT': os.environ.get('FOODSTOCK_DB_PORT', ''),
+            # Keep connections open between requests, checked by DB_HEALTH_CHECKS
+            'CONN_MAX_AGE': int(os.environ.get('FOODSTOCK_DB_CONN_MAX_AGE', 60)),
+            'OPTIONS': {
+                'connect_timeout': 5,
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('FOODSTOCK_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'OPTIONS': {
+                # Seconds a writer waits for the database lock, see SQLITE_PRAGMAS for the tuning
+                'timeout': 20,
+            },
+        }
+    }
+
 
-DATABASES = {
+# Cache
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+# Set FOODSTOCK_REDIS_URL to share the inventory cache between processes (requires django-redis)
+# Change notifications also go through it then, so clients waiting on one process see writes made by the others
+# Without it every process keeps its own LRU response cache, entries are keyed by the ETag so a missed invalidation can't serve stale data
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'inventory': {
+        'BACKEND': 'inventory.cache.LRUCache',
+        'LOCATION': 'inventory',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }
 
+if os.environ.get('FOODSTOCK_REDIS_URL'):
+    CACHES['inventory'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ['FOODSTOCK_REDIS_URL'],
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
@@ -103,6 +155,22 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+
+# Password hashing
+# https://docs.djangoproject.com/en/2.0/topics/auth/passwords/
+# Set FOODSTOCK_FAST_PASSWORD_HASHER to hash new passwords with MD5 in test and benchmark runs only
+
+PASSWORD_HASHERS = [
+    'inventory.hashers.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.BCryptPasswordHasher',
+]
+
+if os.environ.get('FOODSTOCK_FAST_PASSWORD_HASHER'):
+    PASSWORD_HASHERS.insert(0, 'django.contrib.auth.hashers.MD5PasswordHasher')
+
 REST_FRAMEWORK = {
     # When you enable API versioning, the request.version attribute will contain a string
     # that corresponds to the version requested in the incoming client request.
@@ -113,10 +181,22 @@ REST_FRAMEWORK = {
     ],
     # Authentication settings
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_jwt.authentication.JSONWebTokenAuthentication',
+        'inventory.authentication.CachedJSONWebTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
+    # 503 with Retry-After when the password hashing pool is saturated
+    'EXCEPTION_HANDLER': 'inventory.views.exception_handler',
+    # Compact JSON encoding and decoding, with orjson when it is installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'inventory.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'inventory.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 # JWT settings
@@ -148,6 +228,7 @@ JWT_AUTH = {
     'JWT_AUDIENCE': None,
     'JWT_ISSUER': None,
 
+    # Tokens can be refreshed at auth/refresh/ when enabled
     'JWT_ALLOW_REFRESH': False,
     'JWT_REFRESH_EXPIRATION_DELTA': datetime.timedelta(days=7),
 
@@ -155,6 +236,31 @@ JWT_AUTH = {
     'JWT_AUTH_COOKIE': None,
 }
 
+# Inventory settings
+INVENTORY = {
+    'BULK_CREATE_BATCH_SIZE': 500,
+    'BULK_UPDATE_BATCH_SIZE': 200,
+    'RESPONSE_CACHE': 'inventory',
+    'RESPONSE_CACHE_TIMEOUT': 300,
+    'STREAM_CHUNK_SIZE': 2000,
+    'AUTH_CACHE_SIZE': 10000,
+    'AUTH_CACHE_TIMEOUT': 60,
+    'PASSWORD_HASHING_WORKERS': 2,
+    'PASSWORD_HASHING_QUEUE_SIZE': 8,
+    'STATELESS_LOGIN': True,
+    'NOTIFICATION_BACKEND': 'inventory.notifications.%s' % ('CacheBroker' if os.environ.get('FOODSTOCK_REDIS_URL') else 'LocalBroker'),
+    'LONG_POLL_TIMEOUT': 25,
+    'EVENT_STREAM_DURATION': 300,
+    'SQLITE_PRAGMAS': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 20000,
+        'mmap_size': 268435456,
+    },
+    'DB_HEALTH_CHECKS': DATABASE_PROFILE == 'postgresql',
+    'INSTRUMENTATION': bool(os.environ.get('FOODSTOCK_INSTRUMENTATION')),
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/2.0/topics/i18n/
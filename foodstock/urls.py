@@ -17,8 +17,11 @@ from django.contrib import admin
 from django.urls import include, path
 from rest_framework_jwt.views import obtain_jwt_token
 
+from inventory.instrumentation import metrics
+
 urlpatterns = [
     path('inventory/', include('inventory.urls')),
     path('api-token-auth/', obtain_jwt_token, name='create-token'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
 ]
@@ -0,0 +1,46 @@
+import time
+
+from rest_framework_jwt.authentication import JSONWebTokenAuthentication
+
+from .cache import TTLCache
+from .conf import inventory_setting
+
+# Users of the recently seen tokens, shared by the requests of the process
+token_users = TTLCache(inventory_setting('AUTH_CACHE_SIZE'))
+
+
+class CachedJSONWebTokenAuthentication(JSONWebTokenAuthentication):
+    """
+    JSON Web Token authentication keeping the user of recently seen tokens in memory
+    so the token is decoded and the user is fetched only once per AUTH_CACHE_TIMEOUT
+    """
+    payload = None
+
+    def authenticate(self, request):
+        jwt_value = self.get_jwt_value(request)
+        if jwt_value is None:
+            return None
+
+        user = token_users.get(jwt_value)
+        if user is not None:
+            return (user, jwt_value)
+
+        user, jwt_value = super().authenticate(request)
+        expires_at = time.time() + inventory_setting('AUTH_CACHE_TIMEOUT')
+        if self.payload.get('exp'):
+            expires_at = min(expires_at, self.payload['exp'])
+        token_users.set(jwt_value, user, expires_at)
+        return (user, jwt_value)
+
+    def authenticate_credentials(self, payload):
+
+        # Keep the decoded payload for the cache expiration
+        self.payload = payload
+        return super().authenticate_credentials(payload)
+
+
+def forget_user(user):
+    """
+    Drop the cached tokens of the user, e.g. when it is deactivated
+    """
+    token_users.delete_values(lambda cached_user: cached_user.pk == user.pk)
@@ -0,0 +1,157 @@
+from django.db import connections, transaction
+from django.db.models import Case, Value, When
+from django.db.models.deletion import Collector
+from django.db.models.functions import Cast
+
+# PostgreSQL accepts at most this many parameters in a statement, Django doesn't cap its batches
+POSTGRESQL_MAX_QUERY_PARAMS = 65535
+
+
+def max_batch_size(connection, fields, objs):
+    """
+    Number of rows taking a parameter per field that fit in a single statement
+    """
+    batch_size = connection.ops.bulk_batch_size(fields, objs)
+    if connection.vendor == 'postgresql':
+        batch_size = min(batch_size, POSTGRESQL_MAX_QUERY_PARAMS // len(fields))
+    return max(batch_size, 1)
+
+
+def bulk_update(queryset, objs, fields, batch_size=None):
+    """
+    Save the given fields of objs with a single UPDATE statement per batch
+    Uses QuerySet.bulk_update on Django versions providing it (2.2+)
+    """
+    objs = list(objs)
+    fields = list(fields)
+    if not objs or not fields:
+        return
+    if hasattr(queryset, 'bulk_update'):
+        queryset.bulk_update(objs, fields, batch_size=batch_size)
+        return
+
+    model = queryset.model
+    model_fields = [model._meta.get_field(name) for name in fields]
+    connection = connections[queryset.db]
+
+    # Every row takes its pk in the IN clause plus a WHEN pk THEN value pair per field,
+    # which must stay under the parameter limit of the backend
+    max_size = max_batch_size(connection, ['pk'] + fields * 2, objs)
+    batch_size = min(batch_size, max_size) if batch_size else max_size
+
+    # PostgreSQL can't infer the type of the CASE parameters
+    requires_cast = connection.vendor == 'postgresql'
+
+    with transaction.atomic(using=queryset.db):
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            updates = {}
+            for field in model_fields:
+                whens = [
+                    When(pk=obj.pk, then=Value(getattr(obj, field.attname), output_field=field))
+                    for obj in batch
+                ]
+                case = Case(*whens, output_field=field)
+                updates[field.attname] = Cast(case, output_field=field) if requires_cast else case
+            queryset.filter(pk__in=[obj.pk for obj in batch]).update(**updates)
+
+
+def bulk_upsert(queryset, objs, unique_fields, update_fields, batch_size=None):
+    """
+    Insert objs or update the given fields of the rows matching them on unique_fields
+    Returns the primary keys of the created and of the updated rows
+    Uses INSERT ... ON CONFLICT on PostgreSQL, otherwise selects the existing rows
+    and runs bulk_create and bulk_update, in both cases inside a single transaction
+    """
+    objs = list(objs)
+    if not objs:
+        return [], []
+    model = queryset.model
+    batch_size = batch_size or len(objs)
+    with transaction.atomic(using=queryset.db):
+        if connections[queryset.db].vendor == 'postgresql':
+            return _upsert_on_conflict(queryset, objs, unique_fields, update_fields, batch_size)
+
+        unique_attnames = [model._meta.get_field(name).attname for name in unique_fields]
+
+        def unique_key(obj):
+            return tuple(getattr(obj, attname) for attname in unique_attnames)
+
+        def select_existing(batch):
+            lookups = {
+                '{}__in'.format(attname): {getattr(obj, attname) for obj in batch}
+                for attname in unique_attnames
+            }
+            return {unique_key(row): row for row in queryset.filter(**lookups)}
+
+        created, updated = [], []
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            existing = select_existing(batch)
+            new_objs, changed_objs = [], []
+            for obj in batch:
+                row = existing.get(unique_key(obj))
+                if row is None:
+                    new_objs.append(obj)
+                    continue
+                for name in update_fields:
+                    attname = model._meta.get_field(name).attname
+                    setattr(row, attname, getattr(obj, attname))
+                changed_objs.append(row)
+            new_objs = queryset.bulk_create(new_objs, batch_size=batch_size)
+            bulk_update(queryset, changed_objs, update_fields, batch_size=batch_size)
+
+            # Backends not returning the new ids get them back by their unique fields
+            if any(obj.pk is None for obj in new_objs):
+                new_objs = select_existing(new_objs).values()
+            created.extend(obj.pk for obj in new_objs)
+            updated.extend(obj.pk for obj in changed_objs)
+        return created, updated
+
+
+def _upsert_on_conflict(queryset, objs, unique_fields, update_fields, batch_size):
+    connection = connections[queryset.db]
+    quote_name = connection.ops.quote_name
+    meta = queryset.model._meta
+    insert_fields = [field for field in meta.concrete_fields if not field.primary_key]
+    conflict_columns = [meta.get_field(name).column for name in unique_fields]
+    update_columns = [meta.get_field(name).column for name in update_fields]
+    row_placeholder = '({})'.format(', '.join(['%s'] * len(insert_fields)))
+
+    # Every row takes a parameter per inserted field
+    batch_size = min(batch_size, max_batch_size(connection, insert_fields, objs))
+
+    created, updated = [], []
+    with connection.cursor() as cursor:
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            sql = 'INSERT INTO {} ({}) VALUES {} ON CONFLICT ({}) DO UPDATE SET {} RETURNING {}, (xmax = 0)'.format(
+                quote_name(meta.db_table),
+                ', '.join(quote_name(field.column) for field in insert_fields),
+                ', '.join([row_placeholder] * len(batch)),
+                ', '.join(quote_name(column) for column in conflict_columns),
+                ', '.join('{0} = EXCLUDED.{0}'.format(quote_name(column)) for column in update_columns),
+                quote_name(meta.pk.column),
+            )
+            params = [
+                field.get_db_prep_save(getattr(obj, field.attname), connection=connection)
+                for obj in batch for field in insert_fields
+            ]
+            cursor.execute(sql, params)
+
+            # xmax is 0 for the rows inserted by the statement
+            for pk, inserted in cursor.fetchall():
+                (created if inserted else updated).append(pk)
+    return created, updated
+
+
+def bulk_delete(queryset):
+    """
+    Delete the rows of queryset with a single DELETE statement when no cascade
+    or delete signal receiver needs the objects, otherwise use QuerySet.delete()
+    Returns the number of deleted rows
+    """
+    if Collector(using=queryset.db).can_fast_delete(queryset):
+        return queryset._raw_delete(queryset.db)
+    return queryset.delete()[0]
+
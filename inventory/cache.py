@@ -0,0 +1,227 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .conf import inventory_setting
+
+
+class CacheStats(object):
+    """
+    Thread safe hit and miss counters of a cache
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+class TTLCache(object):
+    """
+    Thread safe in-process LRU cache whose entries expire at a given timestamp
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self.entries[key]
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+        self.stats.record(entry is not None)
+        return entry[0] if entry is not None else None
+
+    def set(self, key, value, expires_at):
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def add(self, key, value, expires_at):
+        """
+        Set the entry unless a live one exists, returns whether it was set
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                return False
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return True
+
+    def incr(self, key, delta):
+        """
+        Add delta to a live entry in place, raises KeyError if there is none
+        """
+        with self.lock:
+            value, expires_at = self.entries[key]
+            if expires_at <= time.time():
+                del self.entries[key]
+                raise KeyError(key)
+            self.entries[key] = (value + delta, expires_at)
+            self.entries.move_to_end(key)
+            return value + delta
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_values(self, predicate):
+        """
+        Remove the entries whose value matches the predicate
+        """
+        with self.lock:
+            for key in [key for key, (value, _) in self.entries.items() if predicate(value)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# TTLCaches of the LRUCache backends by location, shared by the threads like LocMemCache's
+_lru_caches = {}
+_lru_caches_lock = threading.Lock()
+
+
+class LRUCache(BaseCache):
+    """
+    In-process cache backend evicting the least recently used entries beyond MAX_ENTRIES
+    LocMemCache culls a third of its entries in arbitrary order once full, which drops hot response entries
+    Values are stored as is, not pickled, so they must not be mutated once cached
+    """
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        with _lru_caches_lock:
+            self.store = _lru_caches.setdefault(name, TTLCache(self._max_entries))
+
+    def expires_at(self, timeout):
+        expires_at = self.get_backend_timeout(timeout)
+        return float('inf') if expires_at is None else expires_at
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self.store.add(key, value, self.expires_at(timeout))
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        value = self.store.get(key)
+        return default if value is None else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.store.set(key, value, self.expires_at(timeout))
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        try:
+            return self.store.incr(key, delta)
+        except KeyError:
+            raise ValueError("Key '%s' not found" % key)
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.store.delete(key)
+
+    def clear(self):
+        self.store.clear()
+
+
+class InventoryCache(object):
+    """
+    Per user cache of serialized food responses on top of Django's cache framework
+    Every write bumps the user's version, so entries cached before it are never read again
+    """
+    stats = CacheStats()
+
+    def __init__(self, cache, timeout=None):
+        self.cache = cache
+        self.timeout = timeout
+
+    @staticmethod
+    def version_key(user):
+        return 'inventory:version:{}'.format(user.pk)
+
+    @staticmethod
+    def initial_version():
+
+        # Start from the current time so a lost version never points to older entries
+        return int(time.time() * 1000)
+
+    def get_version(self, user):
+        key = self.version_key(user)
+        version = self.cache.get(key)
+        if version is None:
+            self.cache.add(key, self.initial_version(), None)
+            version = self.cache.get(key)
+        return version
+
+    def data_key(self, request, version, etag=None):
+        """
+        The ETag of the request binds the entry to the data state read from the database,
+        so a write whose invalidation didn't reach this cache can't serve stale data
+        """
+        representation = '{}|{}'.format(request.get_full_path(), etag or '')
+        digest = hashlib.md5(representation.encode('utf-8')).hexdigest()
+        return 'inventory:food:{}:{}:{}'.format(request.user.pk, version, digest)
+
+    def lookup(self, request, etag=None):
+        """
+        Return the cache key of the request and its cached data, None if not cached
+        The key is built before the database is read so a concurrent write can't be masked
+        """
+        key = self.data_key(request, self.get_version(request.user), etag)
+        data = self.cache.get(key)
+        self.stats.record(data is not None)
+        return key, data
+
+    def store(self, key, data):
+        self.cache.set(key, data, self.timeout)
+
+    def invalidate(self, user):
+        key = self.version_key(user)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, self.initial_version(), None)
+
+
+def inventory_cache():
+    """
+    Get the inventory cache configured in the settings, None if caching is disabled
+    """
+    alias = inventory_setting('RESPONSE_CACHE')
+    if not alias:
+        return None
+    return InventoryCache(caches[alias], timeout=inventory_setting('RESPONSE_CACHE_TIMEOUT'))
@@ -0,0 +1,57 @@
+from django.conf import settings
+
+# Default values of the INVENTORY dict in the project settings
+DEFAULTS = {
+    # Number of rows sent in a single INSERT statement by batch creation
+    'BULK_CREATE_BATCH_SIZE': 500,
+    # Number of rows changed by a single UPDATE statement by batch update
+    'BULK_UPDATE_BATCH_SIZE': 200,
+    # Alias in CACHES used to cache food responses per user, None disables the cache
+    'RESPONSE_CACHE': None,
+    # Seconds a cached food response is kept
+    'RESPONSE_CACHE_TIMEOUT': 300,
+    # Number of foods read and encoded at once by streamed food lists
+    'STREAM_CHUNK_SIZE': 2000,
+    # Maximum number of tokens whose user is kept in memory by CachedJSONWebTokenAuthentication
+    'AUTH_CACHE_SIZE': 10000,
+    # Maximum seconds a token's user is kept in memory, tokens never outlive their expiration
+    'AUTH_CACHE_TIMEOUT': 60,
+    # Number of threads hashing passwords
+    'PASSWORD_HASHING_WORKERS': 2,
+    # Number of password hashes waiting for a thread before logins are rejected
+    'PASSWORD_HASHING_QUEUE_SIZE': 8,
+    # Only issue a JWT on login, without writing a session nor last_login
+    'STATELESS_LOGIN': False,
+    # Pub/sub class notifying the waiters of food changes, CacheBroker shares them between processes
+    'NOTIFICATION_BACKEND': 'inventory.notifications.LocalBroker',
+    # Alias in CACHES used by CacheBroker
+    'NOTIFICATION_CACHE': 'inventory',
+    # Seconds between two reads of the cache by CacheBroker waiters
+    'NOTIFICATION_POLL_INTERVAL': 0.5,
+    # Maximum seconds a long-poll waits for a change, also the keep-alive interval of event streams
+    'LONG_POLL_TIMEOUT': 25,
+    # Seconds an event stream stays open before the client has to reconnect
+    'EVENT_STREAM_DURATION': 300,
+    # PRAGMA statements run on every new SQLite connection
+    'SQLITE_PRAGMAS': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 20000,
+        'mmap_size': 268435456,
+    },
+    # Check persistent connections at the start of every request and drop the broken ones
+    'DB_HEALTH_CHECKS': False,
+    # Time the phases of every request, see inventory.instrumentation
+    'INSTRUMENTATION': False,
+    # Number of changes kept per user by the compact_changes command, older sync tokens get the whole inventory
+    'CHANGE_LOG_RETENTION': 10000,
+    # Seconds the stock endpoints collect the changes before writing them, 0 writes them immediately
+    'STOCK_COALESCE_WINDOW': 0,
+}
+
+
+def inventory_setting(name):
+    """
+    Get an inventory setting, falling back to its default value
+    """
+    return getattr(settings, 'INVENTORY', {}).get(name, DEFAULTS[name])
@@ -1,5 +1,8 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework.response import Response
 from rest_framework.views import status
+from .cache import inventory_cache
 from .models import Food
 import re
 
@@ -52,6 +55,20 @@ def validate_food_names(fn):
         return fn(*args, **kwargs)
     return decorated
 
+def parse_ids(request):
+    """
+    Get the ids of the "ids" query param as a list of integers, None if the param is malformed
+    """
+    ids_str = request.query_params.get('ids', '')
+    if not re.fullmatch(r"\d+(?:,\d+)*", ids_str):
+        return None
+    return [int(object_id) for object_id in ids_str.split(',')]
+
+def invalid_ids_response():
+    
+    # unauthorized characters
+    return Response(data={"message": "Unauthorized characters in \"ids\" parameter. Correct format is numbers separated by \",\" characters."}, status=status.HTTP_400_BAD_REQUEST)
+
 def validate_for_list_update(fn):
     def decorated(*args, **kwargs):
         
@@ -67,18 +84,9 @@ def validate_for_list_update(fn):
             # many param is not True
             return Response(data={"message": "\"many\" should be True"}, status=status.HTTP_400_BAD_REQUEST)
             
-        ids_str = request.query_params['ids']
-        if not re.match("\d+(?:,\d+)?", ids_str):
-            
-            # unauthorized characters
-            return Response(data={"message": "Unauthorized characters in \"ids\" parameter. Correct format is numbers separated by \",\" characters."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        ids = ids_str.split(',')
-        
-        if not isinstance(ids, list):
-        
-            # ids param not a list
-            return Response(data={"message": "Format error. \"ids\" should be a list."}, status=status.HTTP_400_BAD_REQUEST)
+        ids = parse_ids(request)
+        if ids is None:
+            return invalid_ids_response()
         
         if not isinstance(request.data, list) or len(ids) != len(request.data):
             
@@ -86,3 +94,54 @@ def validate_for_list_update(fn):
             return Response(data={"message": "\"ids\" param length did not match request.data length"}, status=status.HTTP_400_BAD_REQUEST)
         return fn(*args, **kwargs)
     return decorated
+
+def conditional_get(validators):
+    """
+    Answer conditional GET requests before running the view
+    validators is called with the view arguments and returns an (etag, last_modified) tuple,
+    last_modified being a timestamp, the ETag is kept on the request for cached_response
+    """
+    def decorator(fn):
+        def decorated(*args, **kwargs):
+            
+            # args[0] == GenericView Object
+            request = args[0].request
+            etag, last_modified = validators(*args, **kwargs)
+            request.inventory_etag = etag
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = fn(*args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            
+            # Both 200 and 304 responses carry the validators
+            if etag and not response.has_header('ETag'):
+                response['ETag'] = etag
+            if last_modified and not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(last_modified)
+            return response
+        return decorated
+    return decorator
+
+def cached_response(fn):
+    """
+    Serve the response data from the per user inventory cache when it is enabled
+    Entries are keyed by the ETag of conditional_get when the view is also decorated with it
+    """
+    def decorated(*args, **kwargs):
+        
+        # args[0] == GenericView Object
+        request = args[0].request
+        cache = inventory_cache()
+        if cache is None:
+            return fn(*args, **kwargs)
+        
+        key, data = cache.lookup(request, getattr(request, 'inventory_etag', None))
+        if data is not None:
+            return Response(data, status=status.HTTP_200_OK)
+        
+        response = fn(*args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.store(key, response.data)
+        return response
+    return decorated
@@ -0,0 +1,56 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+BOOLEAN_VALUES = {
+    'true': True,
+    '1': True,
+    'false': False,
+    '0': False,
+}
+
+
+class FoodFilterBackend(BaseFilterBackend):
+    """
+    Filter foods in the database with the query params
+    is_on_stock=true|false
+    name=<prefix>, case insensitive
+    search=<part of the name>, case insensitive
+    modified_since=<ISO 8601 date time>
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        is_on_stock = params.get('is_on_stock')
+        if is_on_stock is not None:
+            if is_on_stock.lower() not in BOOLEAN_VALUES:
+                raise ValidationError({"message": "\"is_on_stock\" should be true or false"})
+            queryset = queryset.filter(is_on_stock=BOOLEAN_VALUES[is_on_stock.lower()])
+
+        name = params.get('name')
+        if name:
+            queryset = queryset.filter(name__istartswith=name)
+
+        search = params.get('search')
+        if search:
+            queryset = queryset.filter(name__icontains=search)
+
+        modified_since = params.get('modified_since')
+        if modified_since:
+            queryset = queryset.filter(date_modified__gte=self.parse_date(modified_since))
+
+        return queryset
+
+    @staticmethod
+    def parse_date(value):
+        try:
+            date = parse_datetime(value)
+        except ValueError:
+            date = None
+        if date is None:
+            raise ValidationError({"message": "\"modified_since\" should be an ISO 8601 date time"})
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        return date
@@ -0,0 +1,86 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.http import JsonResponse
+
+from .conf import inventory_setting
+
+UNAVAILABLE_MESSAGE = "Too many logins in progress, please retry later"
+# Seconds sent in the Retry-After header of the 503 responses
+UNAVAILABLE_RETRY_AFTER = 1
+
+
+class PasswordHashingUnavailable(Exception):
+    """
+    Raised when the password hashing pool has no free worker nor queue slot
+    Answered with a 503 by inventory.views.exception_handler on the API views
+    and by PasswordHashingMiddleware on the other ones
+    """
+
+
+class HashingPool(object):
+    """
+    Size limited executor with a bounded queue for password hashing
+    Callers are rejected right away instead of waiting when it is saturated
+    """
+
+    def __init__(self, workers, queue_size):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise PasswordHashingUnavailable()
+        try:
+            return self.executor.submit(fn, *args).result()
+        finally:
+            self.slots.release()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hashing_pool():
+    """
+    Get the process wide password hashing pool, created on first use
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(
+                    inventory_setting('PASSWORD_HASHING_WORKERS'),
+                    inventory_setting('PASSWORD_HASHING_QUEUE_SIZE'),
+                )
+    return _pool
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 hasher computing the hashes on the password hashing pool
+    The algorithm name is unchanged so existing hashes stay valid
+    """
+
+    def encode(self, password, salt, iterations=None):
+        return hashing_pool().run(super().encode, password, salt, iterations)
+
+
+class PasswordHashingMiddleware(object):
+    """
+    Answer a saturated password hashing pool with a 503 on the views outside DRF, like the admin login
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, PasswordHashingUnavailable):
+            return None
+        response = JsonResponse({"message": UNAVAILABLE_MESSAGE}, status=503)
+        response['Retry-After'] = str(UNAVAILABLE_RETRY_AFTER)
+        return response
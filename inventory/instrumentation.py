@@ -0,0 +1,244 @@
+import bisect
+import threading
+import time
+from contextlib import ExitStack
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+from .authentication import token_users
+from .cache import InventoryCache
+from .conf import inventory_setting
+
+# Upper bounds of the histogram buckets
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Phases in the order of the Server-Timing header
+PHASES = ('auth', 'db', 'serialize', 'render', 'total')
+
+
+class RequestTimings(object):
+    """
+    Seconds spent in each phase of a request and the number of queries it ran
+    Phases overlap: auth and serialize include their own database time
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations = {}
+        self.queries = 0
+        self.db_time = 0.0
+        self.handler_start = None
+        self.handler_db_time = 0.0
+        self.render_start = None
+
+    def add(self, phase, duration):
+        self.durations[phase] = self.durations.get(phase, 0.0) + duration
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+    def start_handler(self):
+        self.handler_start = time.perf_counter()
+        self.handler_db_time = self.db_time
+
+    def end_handler(self):
+        """
+        Count the time of the view handler outside the database as serialization
+        """
+        if self.handler_start is None:
+            return
+        handler_time = time.perf_counter() - self.handler_start
+        self.add('serialize', max(handler_time - (self.db_time - self.handler_db_time), 0.0))
+        self.handler_start = None
+        self.render_start = time.perf_counter()
+
+    def end_render(self, response):
+        if self.render_start is not None:
+            self.add('render', time.perf_counter() - self.render_start)
+            self.render_start = None
+        return response
+
+    def finish(self):
+        self.durations['db'] = self.db_time
+        self.durations['total'] = time.perf_counter() - self.start
+
+    def server_timing(self):
+        metrics = []
+        for phase in PHASES:
+            if phase not in self.durations:
+                continue
+            metric = '{};dur={:.3f}'.format(phase, self.durations[phase] * 1000)
+            if phase == 'db':
+                metric += ';desc="{} queries"'.format(self.queries)
+            metrics.append(metric)
+        return ', '.join(metrics)
+
+
+class Histogram(object):
+    """
+    Cumulative histogram in the Prometheus format
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        """
+        Yield the (le, cumulative count) pairs, +Inf last
+        """
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry(object):
+    """
+    Thread safe histograms of the request phases and queries per view
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = {}
+        self.queries = {}
+
+    def observe(self, view, timings):
+        with self.lock:
+            for phase, duration in timings.durations.items():
+                key = (view, phase)
+                if key not in self.durations:
+                    self.durations[key] = Histogram(DURATION_BUCKETS)
+                self.durations[key].observe(duration)
+            if view not in self.queries:
+                self.queries[view] = Histogram(QUERY_BUCKETS)
+            self.queries[view].observe(timings.queries)
+
+    def clear(self):
+        with self.lock:
+            self.durations.clear()
+            self.queries.clear()
+
+    @staticmethod
+    def histogram_lines(name, labels, histogram):
+        label_str = ','.join('{}="{}"'.format(key, value) for key, value in labels)
+        for bound, count in histogram.samples():
+            yield '{}_bucket{{{},le="{}"}} {}'.format(name, label_str, bound, count)
+        yield '{}_sum{{{}}} {}'.format(name, label_str, histogram.sum)
+        yield '{}_count{{{}}} {}'.format(name, label_str, sum(histogram.counts))
+
+    def render(self):
+        """
+        Render the histograms and the cache counters in the Prometheus text format
+        """
+        lines = [
+            '# HELP inventory_request_phase_seconds Time spent in each phase of a request',
+            '# TYPE inventory_request_phase_seconds histogram',
+        ]
+        with self.lock:
+            for (view, phase), histogram in sorted(self.durations.items()):
+                lines.extend(self.histogram_lines('inventory_request_phase_seconds', (('view', view), ('phase', phase)), histogram))
+            lines.extend([
+                '# HELP inventory_request_queries Number of database queries of a request',
+                '# TYPE inventory_request_queries histogram',
+            ])
+            for view, histogram in sorted(self.queries.items()):
+                lines.extend(self.histogram_lines('inventory_request_queries', (('view', view),), histogram))
+
+        caches = (('response', InventoryCache.stats.as_dict()), ('auth', token_users.stats.as_dict()))
+        for result in ('hits', 'misses'):
+            lines.extend([
+                '# HELP inventory_cache_{}_total Lookups of the inventory caches'.format(result),
+                '# TYPE inventory_cache_{}_total counter'.format(result),
+            ])
+            for cache, stats in caches:
+                lines.append('inventory_cache_{}_total{{cache="{}"}} {}'.format(result, cache, stats[result]))
+        return '\n'.join(lines) + '\n'
+
+
+# Metrics of the requests of the process
+registry = MetricsRegistry()
+
+
+class InstrumentationMiddleware(object):
+    """
+    Time the database, authentication, serialization and rendering of every request
+    The phases are sent in the Server-Timing header and aggregated per URL name in the registry
+    Removed from the middleware chain unless the INSTRUMENTATION setting is enabled
+    """
+
+    def __init__(self, get_response):
+        if not inventory_setting('INSTRUMENTATION'):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        request.inventory_timings = timings
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings.execute_wrapper))
+            response = self.get_response(request)
+        timings.finish()
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.url_name if resolver_match and resolver_match.url_name else 'unknown'
+        registry.observe(view, timings)
+        response['Server-Timing'] = timings.server_timing()
+        return response
+
+
+class InstrumentedViewMixin(object):
+    """
+    APIView mixin reporting the authentication, serialization and rendering times
+    to InstrumentationMiddleware, does nothing when the middleware is not used
+    """
+
+    def perform_authentication(self, request):
+        timings = getattr(request, 'inventory_timings', None)
+        if timings is None:
+            return super().perform_authentication(request)
+        start = time.perf_counter()
+        try:
+            return super().perform_authentication(request)
+        finally:
+            timings.add('auth', time.perf_counter() - start)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        timings = getattr(request, 'inventory_timings', None)
+        if timings is not None:
+            timings.start_handler()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        timings = getattr(request, 'inventory_timings', None)
+        if timings is not None and timings.handler_start is not None:
+            timings.end_handler()
+
+            # Responses are rendered by the handler once the view returned them
+            if hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+                response.add_post_render_callback(timings.end_render)
+        return response
+
+
+def metrics(request):
+    """
+    GET /metrics
+    """
+    if not inventory_setting('INSTRUMENTATION'):
+        raise Http404()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
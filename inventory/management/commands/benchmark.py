@@ -0,0 +1,236 @@
+import json
+import math
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from rest_framework_jwt.settings import api_settings as jwt_settings
+
+from inventory.conf import inventory_setting
+from inventory.models import Food
+
+PASSWORD = 'benchmark'
+
+
+def percentile(values, percent):
+    """
+    Nearest rank percentile of a list of values
+    """
+    ordered = sorted(values)
+    rank = max(int(math.ceil(percent / 100 * len(ordered))), 1)
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    help = "Measure the food and auth endpoints in-process and report the results as JSON"
+
+    scenario_names = (
+        'list', 'list_page', 'retrieve', 'create', 'batch_create',
+        'bulk_put', 'bulk_patch', 'delete_all', 'login',
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help="Number of users")
+        parser.add_argument('--foods', type=int, default=1000, help="Number of foods of each user")
+        parser.add_argument('--repeat', type=int, default=50, help="Number of requests of each scenario")
+        parser.add_argument('--batch-size', type=int, default=100, help="Number of foods in batch requests")
+        parser.add_argument('--scenario', action='append', choices=self.scenario_names,
+                            help="Scenario to run, can be repeated, all scenarios by default")
+        parser.add_argument('--cache', action='store_true', help="Enable the response cache, on the inventory cache alias unless the settings name one")
+        parser.add_argument('--output', help="Write the results to this file instead of stdout")
+        parser.add_argument('--compare', help="Results file of a previous run to compare with")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as error:
+                raise CommandError("Can't read {}: {}".format(options['compare'], error))
+
+        inventory = dict(getattr(settings, 'INVENTORY', {}))
+        inventory['RESPONSE_CACHE'] = (inventory.get('RESPONSE_CACHE') or 'inventory') if options['cache'] else None
+
+        # Work on a throwaway test database so the configured one is never touched
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(INVENTORY=inventory):
+                self.seed(options['users'], options['foods'])
+                results = {
+                    'vendor': connection.vendor,
+                    'django': django.get_version(),
+                    'users': options['users'],
+                    'foods': options['foods'],
+                    'repeat': options['repeat'],
+                    'batch_size': options['batch_size'],
+                    'cache': options['cache'],
+                    'scenarios': self.run_scenarios(options),
+                }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if baseline is not None:
+            results['comparison'] = self.compare(baseline, results)
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def seed(self, users, foods):
+
+        # Hash once, every user shares the password
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([User(username='bench{}'.format(idx), password=password) for idx in range(users + 1)])
+        food_objects = []
+        for user in User.objects.exclude(username='bench{}'.format(users)):
+            food_objects.extend(
+                Food(user=user, name='food{}'.format(idx), description='', is_on_stock=idx % 3 == 0)
+                for idx in range(foods)
+            )
+        Food.objects.bulk_create(food_objects, batch_size=inventory_setting('BULK_CREATE_BATCH_SIZE'))
+
+        # The measured user owns a regular share of the data, the scratch user takes the writes
+        self.user = User.objects.get(username='bench0')
+        self.scratch_user = User.objects.get(username='bench{}'.format(users))
+        self.food_ids = list(Food.objects.filter(user=self.user).order_by('id').values_list('id', flat=True))
+
+    def get_client(self, user):
+        token = jwt_settings.JWT_ENCODE_HANDLER(jwt_settings.JWT_PAYLOAD_HANDLER(user))
+        return Client(HTTP_AUTHORIZATION='JWT {}'.format(token))
+
+    def get_scenarios(self, batch_size, foods):
+        """
+        Map the scenario names to (setup, request) functions of the iteration number
+        setup runs untimed before each request, request returns the client method and its arguments
+        """
+        client = self.get_client(self.user)
+        scratch_client = self.get_client(self.scratch_user)
+        anonymous_client = Client()
+        food_list = reverse('food-list')
+        food_ids = self.food_ids
+
+        def batch_ids(iteration):
+            start = iteration * batch_size % len(food_ids)
+            return (food_ids * 2)[start:start + min(batch_size, len(food_ids))]
+
+        def bulk_path(ids):
+            return '{}?many=true&ids={}'.format(food_list, ','.join(str(food_id) for food_id in ids))
+
+        def bulk_put(iteration):
+            ids = batch_ids(iteration)
+            data = [{'name': 'put{}-{}'.format(iteration, food_id), 'description': 'updated'} for food_id in ids]
+            return client.put, bulk_path(ids), json.dumps(data)
+
+        def bulk_patch(iteration):
+            ids = batch_ids(iteration)
+            data = [{'is_on_stock': iteration % 2 == 0} for _ in ids]
+            return client.patch, bulk_path(ids), json.dumps(data)
+
+        def refill(iteration):
+            Food.objects.bulk_create([
+                Food(user=self.scratch_user, name='scratch{}-{}'.format(iteration, idx), description='')
+                for idx in range(foods)
+            ], batch_size=inventory_setting('BULK_CREATE_BATCH_SIZE'))
+
+        return {
+            'list': (None, lambda iteration: (client.get, food_list, None)),
+            'list_page': (None, lambda iteration: (client.get, food_list + '?page_size=100', None)),
+            'retrieve': (None, lambda iteration: (
+                client.get, reverse('food-detail', kwargs={'pk': food_ids[iteration % len(food_ids)]}), None,
+            )),
+            'create': (None, lambda iteration: (
+                scratch_client.post, food_list, json.dumps({'name': 'single{}'.format(iteration), 'description': ''}),
+            )),
+            'batch_create': (None, lambda iteration: (
+                scratch_client.post, food_list,
+                json.dumps([{'name': 'batch{}-{}'.format(iteration, idx), 'description': ''} for idx in range(batch_size)]),
+            )),
+            'bulk_put': (None, bulk_put),
+            'bulk_patch': (None, bulk_patch),
+            'delete_all': (refill, lambda iteration: (scratch_client.delete, food_list + '?clear=true', None)),
+            'login': (None, lambda iteration: (
+                anonymous_client.post, reverse('auth-login'), json.dumps({'username': self.user.username, 'password': PASSWORD}),
+            )),
+        }
+
+    def run_scenarios(self, options):
+        scenarios = self.get_scenarios(options['batch_size'], options['foods'])
+        names = options['scenario'] or self.scenario_names
+        return {name: self.measure(*scenarios[name], repeat=options['repeat']) for name in names}
+
+    @staticmethod
+    def send(request, iteration):
+        method, path, body = request(iteration)
+        if body is None:
+            return method(path)
+        return method(path, body, content_type='application/json')
+
+    def measure(self, setup, request, repeat):
+        timings = []
+        query_counts = []
+        errors = 0
+        for iteration in range(repeat):
+            if setup is not None:
+                setup(iteration)
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = self.send(request, iteration)
+                timings.append(time.perf_counter() - start)
+            query_counts.append(len(queries))
+            if response.status_code >= 400:
+                errors += 1
+
+        # Trace an extra request apart since tracemalloc slows the timed ones down
+        if setup is not None:
+            setup(repeat)
+        tracemalloc.start()
+        try:
+            self.send(request, repeat)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        timings_ms = [timing * 1000 for timing in timings]
+        return {
+            'requests': repeat,
+            'errors': errors,
+            'throughput_rps': round(repeat / sum(timings), 2),
+            'mean_ms': round(statistics.mean(timings_ms), 3),
+            'p50_ms': round(percentile(timings_ms, 50), 3),
+            'p95_ms': round(percentile(timings_ms, 95), 3),
+            'p99_ms': round(percentile(timings_ms, 99), 3),
+            'queries_median': statistics.median(query_counts),
+            'queries_max': max(query_counts),
+            'peak_memory_kb': round(peak_memory / 1024, 1),
+        }
+
+    @staticmethod
+    def compare(baseline, results):
+        """
+        Ratio of every metric to the baseline, below 1 is better except for the throughput
+        """
+        comparison = {}
+        for name, metrics in results['scenarios'].items():
+            previous = baseline.get('scenarios', {}).get(name)
+            if previous is None:
+                continue
+            comparison[name] = {
+                metric: round(value / previous[metric], 3)
+                for metric, value in metrics.items()
+                if metric not in ('requests', 'errors') and previous.get(metric)
+            }
+        return comparison
@@ -0,0 +1,139 @@
+import datetime
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from inventory.models import Food, FoodChange
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+
+class Command(BaseCommand):
+    help = "Compare query plans and timings of the food access patterns with and without the Food and FoodChange indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help="Number of foods to create")
+        parser.add_argument('--users', type=int, default=100, help="Number of users owning the foods")
+        parser.add_argument('--repeat', type=int, default=20, help="Number of runs of each query")
+
+    def handle(self, *args, **options):
+
+        # Work on a throwaway test database so the configured one is never touched
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.seed(options['rows'], options['users'])
+            user = User.objects.order_by('id')[options['users'] // 2]
+            results = {
+                'vendor': connection.vendor,
+                'rows': options['rows'],
+                'users': options['users'],
+                'without_indexes': self.measure(user, options['repeat'], with_indexes=False),
+                'with_indexes': self.measure(user, options['repeat'], with_indexes=True),
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def seed(self, rows, users):
+        User.objects.bulk_create([User(username="bench{}".format(idx)) for idx in range(users)])
+        user_ids = list(User.objects.values_list('id', flat=True))
+        now = timezone.now()
+        table = Food._meta.db_table
+        sql = "INSERT INTO {} (user_id, name, description, date_modified, is_on_stock) VALUES (%s, %s, %s, %s, %s)".format(table)
+        batch_size = 10000
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, rows, batch_size):
+                cursor.executemany(sql, [
+                    (
+                        user_ids[idx % users],
+                        "food{}".format(idx),
+                        "",
+                        connection.ops.adapt_datetimefield_value(now - datetime.timedelta(seconds=idx)),
+                        idx % 3 == 0,
+                    )
+                    for idx in range(start, min(start + batch_size, rows))
+                ])
+
+            # One change per food, the change log the sync token is read from
+            cursor.execute("INSERT INTO {} (user_id, food_id, action) SELECT user_id, id, %s FROM {}".format(
+                FoodChange._meta.db_table, table
+            ), [FoodChange.CREATED])
+
+    def get_queries(self, user):
+        foods = Food.objects.filter(user=user)
+        middle = foods.order_by('date_modified', 'id')[foods.count() // 2]
+        querysets = {
+            'first_page': foods.order_by('date_modified', 'id')[:100],
+            'keyset_page': foods.filter(
+                Q(date_modified__gt=middle.date_modified) | Q(date_modified=middle.date_modified, id__gt=middle.id)
+            ).order_by('date_modified', 'id')[:100],
+            'out_of_stock': foods.filter(is_on_stock=False),
+            'modified_since': foods.filter(date_modified__gte=middle.date_modified),
+            'by_name': foods.filter(name=middle.name),
+        }
+        queries = {name: queryset.query for name, queryset in querysets.items()}
+
+        # latest_token, the sync token read by the list and detail validators
+        queries['validators'] = self.aggregate_query(FoodChange.objects.filter(user=user), token=Max('id'))
+        return queries
+
+    @staticmethod
+    def aggregate_query(queryset, **aggregates):
+        """
+        The query run by queryset.aggregate(**aggregates), without a GROUP BY
+        """
+        query = queryset.query.chain()
+        query.clear_ordering(force_empty=True)
+        for alias, aggregate in aggregates.items():
+            query.add_annotation(aggregate, alias, is_summary=True)
+        query.default_cols = False
+        return query
+
+    def measure(self, user, repeat, with_indexes):
+        with connection.schema_editor() as schema_editor:
+            for model in (Food, FoodChange):
+                for index in model._meta.indexes:
+                    if with_indexes:
+                        schema_editor.add_index(model, index)
+                    else:
+                        schema_editor.remove_index(model, index)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        results = {}
+        for name, query in self.get_queries(user).items():
+
+            # Time the raw SQL so model instantiation does not hide the database cost
+            sql, params = query.sql_with_params()
+            timings = []
+            with connection.cursor() as cursor:
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    timings.append((time.perf_counter() - start) * 1000)
+            results[name] = {
+                'plan': self.explain(query),
+                'median_ms': round(statistics.median(timings), 3),
+                'max_ms': round(max(timings), 3),
+            }
+        return results
+
+    def explain(self, query):
+        prefix = EXPLAIN_PREFIXES.get(connection.vendor)
+        if prefix is None:
+            return []
+        sql, params = query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [" ".join(str(column) for column in row) for row in cursor.fetchall()]
@@ -0,0 +1,73 @@
+import io
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from inventory.models import Food
+from inventory.parsers import FastJSONParser
+from inventory.renderers import FastJSONRenderer, use_orjson
+from inventory.serializers import FoodFastSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare the JSON rendering and parsing of food lists by DRF's classes and the project's ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--foods', type=int, default=10000, help="Number of foods in the list")
+        parser.add_argument('--repeat', type=int, default=20, help="Number of runs of each operation")
+
+    def handle(self, *args, **options):
+
+        # Unsaved foods serialized like a list response, no database needed
+        user = User(id=1)
+        now = timezone.now()
+        foods = [
+            Food(id=idx, user=user, name="food{}".format(idx), description="description of food {}".format(idx),
+                 date_modified=now, is_on_stock=idx % 2 == 0)
+            for idx in range(options['foods'])
+        ]
+        data = FoodFastSerializer(foods, many=True).data
+        body = JSONRenderer().render(data)
+
+        results = {
+            'encoder': 'orjson' if use_orjson else 'json',
+            'foods': options['foods'],
+            'body_bytes': len(body),
+            'render': self.compare(
+                lambda: JSONRenderer().render(data, 'application/json'),
+                lambda: FastJSONRenderer().render(data, 'application/json'),
+                options['repeat'],
+            ),
+            'parse': self.compare(
+                lambda: JSONParser().parse(io.BytesIO(body)),
+                lambda: FastJSONParser().parse(io.BytesIO(body)),
+                options['repeat'],
+            ),
+        }
+        self.stdout.write(json.dumps(results, indent=2))
+
+    @staticmethod
+    def median_ms(operation, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            operation()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def compare(self, default, fast, repeat):
+        if default() != fast():
+            raise AssertionError("The fast and the default output differ")
+        default_ms = self.median_ms(default, repeat)
+        fast_ms = self.median_ms(fast, repeat)
+        return {
+            'default_median_ms': round(default_ms, 3),
+            'fast_median_ms': round(fast_ms, 3),
+            'speedup': round(default_ms / fast_ms, 2),
+        }
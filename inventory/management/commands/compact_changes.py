@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from inventory.conf import inventory_setting
+from inventory.models import FoodChange
+from inventory.sync import compact_changes
+
+
+class Command(BaseCommand):
+    help = "Remove the oldest food changes of the users above CHANGE_LOG_RETENTION, run it periodically (e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention', type=int, default=None, help="Number of changes kept per user, defaults to CHANGE_LOG_RETENTION")
+
+    def handle(self, *args, **options):
+        retention = options['retention']
+        if retention is None:
+            retention = inventory_setting('CHANGE_LOG_RETENTION')
+        if retention < 1:
+            raise CommandError("The retention should keep at least one change, the latest one is the sync token")
+
+        user_ids = (
+            FoodChange.objects.exclude(action=FoodChange.PRUNED).order_by().values('user_id')
+            .annotate(changes=Count('id')).filter(changes__gt=retention).values_list('user_id', flat=True)
+        )
+        removed = 0
+        for user in User.objects.filter(id__in=list(user_ids)).iterator():
+            removed += compact_changes(user, retention)
+        self.stdout.write("Removed {} changes".format(removed))
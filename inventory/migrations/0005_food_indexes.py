@@ -0,0 +1,21 @@
+# Generated by Django 2.0.6 on 2026-10-18 08:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_food_description'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['user', 'date_modified', 'id'], name='food_user_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['user', 'is_on_stock'], name='food_user_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.0.6 on 2026-10-18 08:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('inventory', '0005_food_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FoodChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('food_id', models.IntegerField(null=True)),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted'), ('cleared', 'Cleared')], max_length=7)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='foodchange',
+            index=models.Index(fields=['user', 'id'], name='foodchange_user_id_idx'),
+        ),
+    ]
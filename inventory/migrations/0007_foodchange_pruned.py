@@ -0,0 +1,18 @@
+# Generated by Django 2.0.6 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_foodchange'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='foodchange',
+            name='action',
+            field=models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted'), ('cleared', 'Cleared'), ('pruned', 'Pruned')], max_length=7),
+        ),
+    ]
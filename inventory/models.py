@@ -12,6 +12,41 @@ class Food(models.Model):
     
     class Meta:
         unique_together = ('user', 'name')
+        indexes = [
+            # Keyset pagination, sync and ETag validators
+            models.Index(fields=['user', 'date_modified', 'id'], name='food_user_modified_idx'),
+            # Stock filtering
+            models.Index(fields=['user', 'is_on_stock'], name='food_user_stock_idx'),
+        ]
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class FoodChange(models.Model):
+    """
+    Change log of the foods, the id of the latest change is the sync token of the user
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    CLEARED = 'cleared'
+    # Marks the newest change removed by compact_changes, older tokens get the whole inventory
+    PRUNED = 'pruned'
+    ACTION_CHOICES = (
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (DELETED, 'Deleted'),
+        (CLEARED, 'Cleared'),
+        (PRUNED, 'Pruned'),
+    )
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Not a foreign key, the change outlives the deleted food
+    food_id = models.IntegerField(null=True)
+    action = models.CharField(max_length=7, choices=ACTION_CHOICES)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='foodchange_user_id_idx'),
+        ]
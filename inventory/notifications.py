@@ -0,0 +1,237 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import close_old_connections, connection, transaction
+from django.utils.module_loading import import_string
+
+from .cache import inventory_cache
+from .conf import inventory_setting
+from .sync import latest_token, record_changes
+
+# Seconds between the checks of a cancelled wait
+CANCEL_CHECK_INTERVAL = 1
+
+
+class LocalBroker(object):
+    """
+    In-process pub/sub waking up the waiters of the same process, threads and event loop coroutines
+    Every publish bumps the version of the user and only wakes up the waiters of that user
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conditions = {}
+        self.versions = {}
+        self.futures = {}
+
+    def condition(self, user_id):
+        with self.lock:
+            if user_id not in self.conditions:
+                self.conditions[user_id] = threading.Condition()
+            return self.conditions[user_id]
+
+    def publish(self, user_id):
+        condition = self.condition(user_id)
+        with condition:
+            self.versions[user_id] = self.versions.get(user_id, 0) + 1
+            condition.notify_all()
+            for loop, future in self.futures.get(user_id, ()):
+                loop.call_soon_threadsafe(wake_up, future)
+
+    def version(self, user_id):
+        with self.condition(user_id):
+            return self.versions.get(user_id, 0)
+
+    def wait(self, user_id, version, timeout):
+        """
+        Block until the version of the user differs from version or the timeout elapses
+        Returns the current version
+        """
+        condition = self.condition(user_id)
+        with condition:
+            condition.wait_for(lambda: self.versions.get(user_id, 0) != version, timeout)
+            return self.versions.get(user_id, 0)
+
+    async def async_wait(self, user_id, version, timeout):
+        """
+        wait for coroutines, publish wakes up the future of the waiter on its event loop
+        """
+        loop = asyncio.get_event_loop()
+        waiter = (loop, loop.create_future())
+        condition = self.condition(user_id)
+        with condition:
+            if self.versions.get(user_id, 0) != version:
+                return self.versions.get(user_id, 0)
+            self.futures.setdefault(user_id, set()).add(waiter)
+        try:
+            await asyncio.wait([waiter[1]], timeout=timeout)
+        finally:
+            with condition:
+                self.futures[user_id].discard(waiter)
+                if not self.futures[user_id]:
+                    del self.futures[user_id]
+        return self.version(user_id)
+
+
+def wake_up(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class CacheBroker(object):
+    """
+    Pub/sub sharing the user versions between processes through a Django cache, e.g. Redis
+    Waiters poll the cache every NOTIFICATION_POLL_INTERVAL seconds
+    """
+
+    def __init__(self):
+        self.cache = caches[inventory_setting('NOTIFICATION_CACHE')]
+        self.poll_interval = inventory_setting('NOTIFICATION_POLL_INTERVAL')
+
+    @staticmethod
+    def key(user_id):
+        return 'inventory:notification:{}'.format(user_id)
+
+    def publish(self, user_id):
+        try:
+            self.cache.incr(self.key(user_id))
+        except ValueError:
+            self.cache.set(self.key(user_id), 1, None)
+
+    def version(self, user_id):
+        return self.cache.get(self.key(user_id), 0)
+
+    def wait(self, user_id, version, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self.version(user_id)
+            remaining = deadline - time.monotonic()
+            if current != version or remaining <= 0:
+                return current
+            time.sleep(min(self.poll_interval, remaining))
+
+    async def async_wait(self, user_id, version, timeout):
+        """
+        wait for coroutines, the cache is read on the default executor between the sleeps
+        """
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        while True:
+            current = await loop.run_in_executor(None, self.version, user_id)
+            remaining = deadline - loop.time()
+            if current != version or remaining <= 0:
+                return current
+            await asyncio.sleep(min(self.poll_interval, remaining))
+
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def notification_broker():
+    """
+    Get the broker configured in the settings, one instance per process
+    """
+    path = inventory_setting('NOTIFICATION_BACKEND')
+    with _brokers_lock:
+        if path not in _brokers:
+            _brokers[path] = import_string(path)()
+        return _brokers[path]
+
+
+def wait_for_changes(user, since, timeout, cancelled=None):
+    """
+    Wait until the user's sync token moves past since, the timeout elapses or the cancelled event is set
+    Returns the latest sync token
+    """
+    broker = notification_broker()
+    deadline = time.monotonic() + timeout
+
+    # Read the version before the token so a change made in between is not missed
+    version = broker.version(user.pk)
+    token = latest_token(user)
+    while token <= since:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (cancelled is not None and cancelled.is_set()):
+            break
+        if cancelled is not None:
+            remaining = min(remaining, CANCEL_CHECK_INTERVAL)
+        new_version = broker.wait(user.pk, version, remaining)
+
+        # Read the token on a timeout too, the publish of a write may not have reached this broker
+        if new_version != version or time.monotonic() >= deadline:
+            version = new_version
+            token = latest_token(user)
+    return token
+
+
+async def async_wait_for_changes(user, since, timeout):
+    """
+    wait_for_changes for the event loop, the wait holds no thread and the database is read on the default executor
+    """
+    loop = asyncio.get_event_loop()
+    broker = notification_broker()
+    deadline = loop.time() + timeout
+
+    # Read the version before the token so a change made in between is not missed
+    version = await loop.run_in_executor(None, broker.version, user.pk)
+    token = await loop.run_in_executor(None, read_latest_token, user)
+    while token <= since:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        new_version = await broker.async_wait(user.pk, version, remaining)
+        if new_version != version or loop.time() >= deadline:
+            version = new_version
+            token = await loop.run_in_executor(None, read_latest_token, user)
+    return token
+
+
+def read_latest_token(user):
+    """
+    latest_token for the executor threads, which close their connections at the end like requests do
+    """
+    try:
+        return latest_token(user)
+    finally:
+        close_old_connections()
+
+
+class FoodChanges(object):
+    """
+    Ids of the user's foods written in an inventory_changes block
+    """
+
+    def __init__(self):
+        self.created = []
+        self.updated = []
+        self.deleted = []
+        self.cleared = False
+
+    def __bool__(self):
+        return bool(self.cleared or self.created or self.updated or self.deleted)
+
+
+@contextmanager
+def inventory_changes(user):
+    """
+    Write the user's foods and record their changes in a single transaction
+    The user row is locked first so the writes of a user commit in the order of their sync tokens,
+    the cached responses are invalidated and the waiters woken up once the block is done
+    """
+    changes = FoodChanges()
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            list(User.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True))
+        yield changes
+        record_changes(user, created=changes.created, updated=changes.updated, deleted=changes.deleted, cleared=changes.cleared)
+    if not changes:
+        return
+    cache = inventory_cache()
+    if cache is not None:
+        cache.invalidate(user)
+    notification_broker().publish(user.pk)
@@ -0,0 +1,79 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class FoodCursorPagination(BasePagination):
+    """
+    Opt-in keyset pagination for foods ordered by (date_modified, id)
+    Only used when the request contains the "cursor" or "page_size" query param,
+    otherwise the whole list is returned as before
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 1000
+    ordering = ('date_modified', 'id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        page_size = request.query_params.get(self.page_size_query_param)
+        if not page_size:
+            return self.page_size
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            raise ValidationError({"message": "\"{}\" should be a positive integer".format(self.page_size_query_param)})
+        if page_size < 1:
+            raise ValidationError({"message": "\"{}\" should be a positive integer".format(self.page_size_query_param)})
+        return min(page_size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            date_modified, pk = position
+            queryset = queryset.filter(
+                Q(date_modified__gt=date_modified) | Q(date_modified=date_modified, id__gt=pk)
+            )
+
+        # Fetch one extra row to know whether there is a next page
+        page = list(queryset.order_by(*self.ordering)[:page_size + 1])
+        has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if has_next else None
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.next_cursor, 'results': data})
+
+    def encode_cursor(self, food):
+        position = "{}|{}".format(food.date_modified.isoformat(), food.id)
+        return base64.urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            date_str, pk = position.rsplit('|', 1)
+            date_modified = parse_datetime(date_str)
+            pk = int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise ValidationError({"message": self.invalid_cursor_message})
+        if date_modified is None:
+            raise ValidationError({"message": self.invalid_cursor_message})
+        return date_modified, pk
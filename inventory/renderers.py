@@ -0,0 +1,114 @@
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Types the json module can't encode (lazy strings, decimals, querysets...) go through DRF's encoder
+encode_default = encoders.JSONEncoder().default
+
+# Shared compact encoder of the fallback, the C accelerated path handles the food types directly
+compact_encoder = json.JSONEncoder(
+    ensure_ascii=JSONRenderer.ensure_ascii,
+    allow_nan=not JSONRenderer.strict,
+    separators=(',', ':'),
+    default=encode_default,
+)
+
+# orjson always outputs UTF-8, so it is only used when UNICODE_JSON is enabled
+use_orjson = orjson is not None and not JSONRenderer.ensure_ascii
+if use_orjson:
+
+    # Datetimes and dict keys are encoded the way JSONRenderer does
+    ORJSON_OPTIONS = getattr(orjson, 'OPT_PASSTHROUGH_DATETIME', 0) | getattr(orjson, 'OPT_NON_STR_KEYS', 0)
+
+
+def dumps(data):
+    """
+    Encode data to compact UTF-8 JSON bytes, with orjson when it is installed
+    """
+    if use_orjson:
+        ret = orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
+    else:
+        ret = compact_encoder.encode(data).encode('utf-8')
+
+    # Escape the line separators as JSONRenderer does to output a strict javascript subset
+    return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer skipping the per call encoder setup for compact output
+    Indented output, e.g. for the browsable API, is left to JSONRenderer
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None or not self.compact:
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class NDJSONRenderer(FastJSONRenderer):
+    """
+    Renderer which serializes to newline delimited JSON, one line per list item
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+        items = data if isinstance(data, list) else [data]
+        return b''.join(super(NDJSONRenderer, self).render(item) + b'\n' for item in items)
+
+    def stream(self, chunks):
+        """
+        Render chunks of list items one at a time
+        """
+        for chunk in chunks:
+            yield self.render(chunk)
+
+
+class EventStreamRenderer(FastJSONRenderer):
+    """
+    Renderer which serializes to a single Server-Sent Event
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+        return self.render_event(data)
+
+    def render_event(self, data, event=None, event_id=None):
+        lines = []
+        if event_id is not None:
+            lines.append('id: {}'.format(event_id).encode('utf-8'))
+        if event is not None:
+            lines.append('event: {}'.format(event).encode('utf-8'))
+        lines.append(b'data: ' + super(EventStreamRenderer, self).render(data))
+        return b'\n'.join(lines) + b'\n\n'
+
+
+def stream_json_array(chunks, renderer=None):
+    """
+    Render chunks of list items as a single JSON array, one chunk at a time
+    """
+    renderer = renderer or FastJSONRenderer()
+    yield b'['
+    separator = b''
+    for chunk in chunks:
+        if not chunk:
+            continue
+
+        # Drop the brackets of the rendered chunk
+        yield separator + renderer.render(chunk)[1:-1]
+        separator = b','
+    yield b']'
@@ -0,0 +1,17 @@
+from django.http import StreamingHttpResponse
+
+
+class AsyncContentResponse(StreamingHttpResponse):
+    """
+    Response whose content is produced on the event loop by foodstock.asgi once the worker thread is released,
+    so waiting for the content holds no thread. Only returned when the server sets environ['foodstock.async_content']
+    async_content is called without arguments on the event loop and returns an async iterator of bytes
+    """
+
+    def __init__(self, async_content, *args, **kwargs):
+        super().__init__((), *args, **kwargs)
+        self.async_content = async_content
+
+
+def async_content_supported(request):
+    return bool(request.META.get('foodstock.async_content'))
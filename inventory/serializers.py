@@ -1,7 +1,17 @@
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.utils import timezone
+from .bulk import bulk_update
+from .conf import inventory_setting
 from .models import Food
 from rest_framework import serializers
+from rest_framework import ISO_8601
 from rest_framework.exceptions import NotFound 
+from rest_framework.settings import api_settings
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -19,36 +29,59 @@ class FoodListSerializer(serializers.ListSerializer):
         Batch foods creation validation
         """
         
-        # Get authenticated user 
-        names = []
+        # Get authenticated user
+        user = self.context['request'].user
+        
+        # Check duplicates inside the request
+        names = set()
         for food in data:
-            food_name = food["name"]
+            food_name = food.get("name", "")
+            if not food_name:
+                continue
             if food_name in names:
                 raise serializers.ValidationError({"message": "Duplicate names are forbidden. Name \"{}\" appears twice in request".format(food_name)})
-            names.append(food_name)
+            names.add(food_name)
+        
+        # Check duplicates against the user's foods with a single query
+        if names:
+            duplicate_food = Food.objects.filter(user=user, name__in=names).first()
+            if duplicate_food:
+                raise serializers.ValidationError({"message": "User already has food named \"{}\"".format(duplicate_food.name)})
         return data
     
     def update(self, ids_set, validated_data):
-        updated_foods = []
-        valid_serializers = []
-        
-        # Check if all objects exist and all data is valid
-        for idx, object_id in enumerate(ids_set):
-            try:
-                food = Food.objects.get(pk=object_id)
-                object_data = validated_data[idx]
-                update_serializer = FoodSerializer(food, data=object_data, context=self.context, partial=self.partial)
-                update_serializer.is_valid(raise_exception=True)
-                valid_serializers.append(update_serializer)
-            except Food.DoesNotExist:
+        """
+        Batch foods update
+        Fetches all foods with one query and saves them with bulk UPDATE statements in one transaction
+        """
+        
+        # Get authenticated user
+        user = self.context['request'].user
+        
+        # Check if all objects exist, data is already validated by is_valid
+        ids = [int(object_id) for object_id in ids_set]
+        foods = Food.objects.filter(user=user).in_bulk(ids)
+        for object_id in ids:
+            if object_id not in foods:
                 raise NotFound({"message": "Food with id: {} does not exist".format(object_id)})
         
-        # If all serializers are valid update the objects
-        for serializer in valid_serializers:
-            serializer.save()
-            updated_foods.append(serializer.data)
+        # Apply the changes in memory
+        updated_foods = []
+        updated_fields = set()
+        now = timezone.now()
+        for object_id, object_data in zip(ids, validated_data):
+            food = foods[object_id]
+            object_data.setdefault('date_modified', now)
+            for attr, value in object_data.items():
+                setattr(food, attr, value)
+            updated_fields.update(object_data)
+            updated_foods.append(food)
+        
+        # If all data is valid update the objects
+        batch_size = inventory_setting('BULK_UPDATE_BATCH_SIZE')
+        bulk_update(Food.objects.all(), updated_foods, updated_fields, batch_size=batch_size)
 
-        return updated_foods
+        return FoodFastSerializer(updated_foods, many=True, fields=self.context.get('fields')).data
 
 class FoodSerializer(serializers.ModelSerializer):
     class Meta:
@@ -63,6 +96,10 @@ class FoodSerializer(serializers.ModelSerializer):
         Single food creation validation
         """
                   
+        # Batch validation checks the names of the whole list at once
+        if isinstance(self.parent, FoodListSerializer):
+            return data
+        
         # Get authenticated user
         user = self.context['request'].user
           
@@ -72,7 +109,159 @@ class FoodSerializer(serializers.ModelSerializer):
             if duplicate_food:
                 raise serializers.ValidationError({"message": "User already has food named \"{}\"".format(duplicate_food.name)})
         return data
+    
+    def update(self, instance, validated_data):
+        
+        # Keep the modification date in step with the changes unless the client sets it
+        validated_data.setdefault('date_modified', timezone.now())
+        return super().update(instance, validated_data)
+  
+
+class FoodUpsertListSerializer(serializers.ListSerializer):
+    
+    def validate(self, data):
+        """
+        Batch foods upsert validation
+        """
+        
+        # Foods are matched on their names, so a name can only appear once
+        names = set()
+        for food in data:
+            if food["name"] in names:
+                raise serializers.ValidationError({"message": "Duplicate names are forbidden. Name \"{}\" appears twice in request".format(food["name"])})
+            names.add(food["name"])
+        
+        # Every food changes the same columns
+        if data and any(food.keys() != data[0].keys() for food in data):
+            raise serializers.ValidationError({"message": "All foods should contain the same fields"})
+        return data
+
+
+class FoodUpsertSerializer(serializers.ModelSerializer):
+    """
+    Food matched on its name by the upsert endpoint, existing names are updated instead of rejected
+    """
+    class Meta:
+        model = Food
+        fields = ('name', 'description', 'is_on_stock')
+        extra_kwargs = {'description': {'required': True}}
+        list_serializer_class = FoodUpsertListSerializer
+  
+
+class StockSerializer(serializers.Serializer):
+    """
+    Stock state sent to the stock endpoints
+    """
+    is_on_stock = serializers.BooleanField()
   
+
+def requested_fields(request):
+    """
+    Get the food fields of the "fields" query param, None if all fields are requested
+    """
+    fields_str = request.query_params.get('fields', '')
+    if not fields_str:
+        return None
+    fields = fields_str.split(',')
+    for field in fields:
+        if field not in FoodSerializer.Meta.fields:
+            raise serializers.ValidationError({"message": "Unknown field \"{}\". Fields are {}".format(field, ", ".join(FoodSerializer.Meta.fields))})
+    return fields
+
+
+class FoodFastSerializer(object):
+    """
+    Read only serializer building the FoodSerializer representation straight from values_list() rows
+    instance can be a queryset, a list of foods or a single food
+    fields restricts the representation to some of FoodSerializer.Meta.fields
+    """
+    columns = ('name', 'date_modified', 'is_on_stock', 'user_id', 'id', 'description')
+    
+    def __init__(self, instance, many=False, fields=None):
+        self.instance = instance
+        self.many = many
+        self.fields = FoodSerializer.Meta.fields
+        if fields is not None:
+            self.fields = tuple(field for field in FoodSerializer.Meta.fields if field in fields)
+            self.columns = tuple(column for field, column in zip(FoodSerializer.Meta.fields, self.columns) if field in fields)
+    
+    @staticmethod
+    def get_datetime_representation():
+        
+        # Shortcut of DateTimeField.to_representation for the default settings
+        if api_settings.DATETIME_FORMAT != ISO_8601 or not settings.USE_TZ:
+            return serializers.DateTimeField().to_representation
+        current_timezone = timezone.get_current_timezone()
+        
+        def to_representation(value):
+            if not value:
+                return None
+            value = value.astimezone(current_timezone).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return to_representation
+    
+    def get_row_getter(self):
+        
+        # attrgetter returns the bare value of a single attribute
+        if len(self.columns) == 1:
+            column = self.columns[0]
+            return lambda food: (getattr(food, column),)
+        return attrgetter(*self.columns)
+    
+    def get_rows(self):
+        if isinstance(self.instance, QuerySet):
+            return self.instance.values_list(*self.columns)
+        return map(self.get_row_getter(), self.instance)
+    
+    def get_to_representation(self):
+        datetime_representation = self.get_datetime_representation()
+        
+        # Keys follow the order of FoodSerializer.Meta.fields
+        if self.fields != FoodSerializer.Meta.fields:
+            fields = self.fields
+            date_index = fields.index('date_modified') if 'date_modified' in fields else None
+            
+            def to_representation(row):
+                data = dict(zip(fields, row))
+                if date_index is not None:
+                    data['date_modified'] = datetime_representation(row[date_index])
+                return data
+            return to_representation
+        
+        def to_representation(row):
+            name, date_modified, is_on_stock, user_id, pk, description = row
+            return {
+                'name': name,
+                'date_modified': datetime_representation(date_modified),
+                'is_on_stock': is_on_stock,
+                'user': user_id,
+                'id': pk,
+                'description': description,
+            }
+        return to_representation
+    
+    @property
+    def data(self):
+        to_representation = self.get_to_representation()
+        if not self.many:
+            return to_representation(self.get_row_getter()(self.instance))
+        return [to_representation(row) for row in self.get_rows()]
+    
+    def iter_chunks(self, chunk_size):
+        """
+        Yield the representation of a queryset in lists of chunk_size foods
+        The rows are read with a server side cursor where the database supports it
+        """
+        to_representation = self.get_to_representation()
+        rows = self.instance.values_list(*self.columns).iterator(chunk_size=chunk_size)
+        while True:
+            chunk = [to_representation(row) for row in islice(rows, chunk_size)]
+            if not chunk:
+                return
+            yield chunk
+        
         
 class TokenSerializer(serializers.Serializer):
     """
@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import forget_user
+from .conf import inventory_setting
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+
+    # Logging in only updates last_login which does not affect authentication
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    forget_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    forget_user(instance)
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in inventory_setting('SQLITE_PRAGMAS').items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    if not inventory_setting('DB_HEALTH_CHECKS'):
+        return
+
+    # Only persistent connections can be broken since the previous request
+    for connection in connections.all():
+        if connection.connection is None or connection.settings_dict['CONN_MAX_AGE'] == 0:
+            continue
+        if not connection.is_usable():
+            connection.close()
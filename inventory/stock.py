@@ -0,0 +1,152 @@
+import atexit
+import logging
+import threading
+
+from django.db import connections
+from django.utils import timezone
+
+from .conf import inventory_setting
+from .models import Food
+from .notifications import inventory_changes
+
+logger = logging.getLogger(__name__)
+
+def set_stock(user, values):
+    """
+    Write the stock states of the user's foods given as a {food id: is_on_stock} dict
+    Only the rows whose state differs are updated, returns the ids of the changed foods
+    """
+    by_value = {}
+    for food_id, is_on_stock in values.items():
+        by_value.setdefault(is_on_stock, []).append(food_id)
+
+    batch_size = inventory_setting('BULK_UPDATE_BATCH_SIZE')
+    now = timezone.now()
+    with inventory_changes(user) as changes:
+        for is_on_stock, ids in by_value.items():
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                foods = Food.objects.filter(user=user, id__in=batch).exclude(is_on_stock=is_on_stock)
+
+                # A single food is known to be changed by the number of updated rows
+                if len(batch) == 1:
+                    if foods.update(is_on_stock=is_on_stock, date_modified=now):
+                        changes.updated.extend(batch)
+                    continue
+                batch_changed = list(foods.values_list('id', flat=True))
+                if batch_changed:
+                    Food.objects.filter(id__in=batch_changed).update(is_on_stock=is_on_stock, date_modified=now)
+                    changes.updated.extend(batch_changed)
+    return changes.updated
+
+
+class StockBuffer(object):
+    """
+    Collect the stock states for window seconds and write them at once,
+    so a food toggled several times within the window is written once with its last state
+    flush_lock is held while the states are written so discard can wait for a running flush
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.pending = {}
+        self.timer = None
+
+    def add(self, user, values):
+        with self.lock:
+            self.pending.setdefault(user.pk, (user, {}))[1].update(values)
+            self.start_timer()
+
+    def start_timer(self):
+        if self.timer is None:
+            self.timer = threading.Timer(self.window, self.flush_on_timer)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def pending_ids(self, user):
+        with self.lock:
+            return list(self.pending.get(user.pk, (user, {}))[1])
+
+    def discard(self, user, ids):
+        """
+        Drop the pending states of the user's foods, once a running flush has written its states
+        """
+        with self.flush_lock, self.lock:
+            values = self.pending.get(user.pk, (user, {}))[1]
+            for food_id in ids:
+                values.pop(food_id, None)
+
+    def flush(self):
+        """
+        Write the pending states user by user, the states of a user whose write fails
+        are put back for the next flush unless a newer state was added meanwhile
+        """
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+            for user, values in pending.values():
+                if not values:
+                    continue
+                try:
+                    set_stock(user, values)
+                except Exception:
+                    logger.exception("Writing the buffered stock states of user %s failed, retrying later", user.pk)
+                    with self.lock:
+                        retried = self.pending.setdefault(user.pk, (user, {}))[1]
+                        for food_id, is_on_stock in values.items():
+                            retried.setdefault(food_id, is_on_stock)
+                        self.start_timer()
+
+    def flush_on_timer(self):
+        try:
+            self.flush()
+        finally:
+
+            # The timer thread opened its own database connections
+            connections.close_all()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def stock_buffer():
+    """
+    Get the buffer of the process, None if STOCK_COALESCE_WINDOW is 0
+    """
+    global _buffer
+    window = inventory_setting('STOCK_COALESCE_WINDOW')
+    if not window:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = StockBuffer(window)
+
+            # Write the states still pending when the process stops
+            atexit.register(_buffer.flush)
+        return _buffer
+
+
+def forget_stock(user, ids=(), names=()):
+    """
+    Drop the buffered stock states of the user's foods another endpoint is about to write
+    an is_on_stock to, so a later flush can't overwrite them, foods can also be given by name
+    Called before the transaction of the write since a running flush locks the user row
+    Only the buffer of the current process is cleared, a state buffered by another process can still
+    overwrite the write, so the stock endpoints should be served by a single process when the window is set
+    """
+    buffer = stock_buffer()
+    if buffer is None:
+        return
+    ids = list(ids)
+    if names:
+        pending = buffer.pending_ids(user)
+        if pending:
+            ids.extend(Food.objects.filter(user=user, id__in=pending, name__in=names).values_list('id', flat=True))
+    if ids:
+        buffer.discard(user, ids)
@@ -0,0 +1,84 @@
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .models import FoodChange
+
+
+def record_changes(user, created=(), updated=(), deleted=(), cleared=False):
+    """
+    Write the changes of the user's foods to the change log with a single INSERT
+    A clear replaces the user's whole change log, the older changes are never reported again
+    """
+    changes = []
+    if cleared:
+        FoodChange.objects.filter(user=user).delete()
+        changes.append(FoodChange(user=user, action=FoodChange.CLEARED))
+    for action, ids in ((FoodChange.CREATED, created), (FoodChange.UPDATED, updated), (FoodChange.DELETED, deleted)):
+        changes.extend(FoodChange(user=user, food_id=food_id, action=action) for food_id in ids)
+    if changes:
+        FoodChange.objects.bulk_create(changes)
+
+
+def latest_token(user):
+    return FoodChange.objects.filter(user=user).aggregate(token=Max('id'))['token'] or 0
+
+
+def compact_changes(user, retention):
+    """
+    Remove the user's changes older than the newest retention ones
+    A pruned change takes the id of the newest removed change, so the tokens behind it are told to start over
+    Returns the number of deleted rows
+    """
+    changes = FoodChange.objects.filter(user=user)
+    with transaction.atomic():
+
+        # Same lock as the writers, a clear can't interleave with the compaction
+        if connection.features.has_select_for_update:
+            list(User.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True))
+        horizon = changes.exclude(action=FoodChange.PRUNED).order_by('-id').values_list('id', flat=True)[retention:retention + 1].first()
+        if horizon is None:
+            return 0
+        removed, _ = changes.filter(id__lte=horizon).delete()
+        FoodChange.objects.create(id=horizon, user=user, action=FoodChange.PRUNED)
+    return removed
+
+
+def collect_changes(user, since):
+    """
+    Collapse the changes made after the since token
+    Returns the new token, whether the foods were cleared and the created, updated and deleted ids,
+    or None when the changes after the token were compacted and the client needs the whole inventory
+    """
+    token = since
+    cleared = False
+    first_actions = {}
+    last_actions = {}
+    changes = FoodChange.objects.filter(user=user, id__gt=since).order_by('id').values_list('id', 'food_id', 'action')
+    for change_id, food_id, action in changes.iterator():
+        token = change_id
+        if action == FoodChange.PRUNED:
+            return None
+        if action == FoodChange.CLEARED:
+
+            # Everything before a clear is gone
+            cleared = True
+            first_actions.clear()
+            last_actions.clear()
+            continue
+        first_actions.setdefault(food_id, action)
+        last_actions[food_id] = action
+
+    created, updated, deleted = [], [], []
+    for food_id, action in last_actions.items():
+        first_action = first_actions[food_id]
+        if action == FoodChange.DELETED:
+
+            # Foods created and deleted since the token were never seen by the client
+            if first_action != FoodChange.CREATED:
+                deleted.append(food_id)
+        elif first_action == FoodChange.CREATED:
+            created.append(food_id)
+        else:
+            updated.append(food_id)
+    return token, cleared, created, updated, deleted
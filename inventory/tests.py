@@ -1,10 +1,44 @@
+import asyncio
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.test import Client, SimpleTestCase, override_settings
 from django.urls import reverse
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
+from rest_framework.renderers import JSONRenderer
 from rest_framework.views import status
+from rest_framework_jwt.settings import api_settings as jwt_settings
+
+from foodstock import asgi
 
-from .models import Food
-from .serializers import FoodSerializer
+from .authentication import token_users
+from .bulk import bulk_upsert
+from .cache import InventoryCache, LRUCache
+from .hashers import HashingPool
+from .instrumentation import registry
+from .models import Food, FoodChange
+from .notifications import CacheBroker, LocalBroker, notification_broker, wait_for_changes
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .responses import AsyncContentResponse
+from .serializers import FoodFastSerializer, FoodSerializer
+from .signals import check_connections
+from .stock import StockBuffer, set_stock, stock_buffer
+from .sync import compact_changes, record_changes
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+from django.utils.http import http_date
 
 class BaseViewTest(APITestCase):
     client = APIClient()
@@ -15,6 +49,8 @@ class BaseViewTest(APITestCase):
             Food.objects.create(user=user, name=name, description="")
 
     def setUp(self):
+        caches['inventory'].clear()
+        
         # add test data
         self.user = User.objects.create_user('user', 'a@a.com', 'password')
         self.assertIsNotNone(self.user, 'user should exist')
@@ -27,6 +63,7 @@ class AuthenticatedViewTest(APITestCase):
     client = APIClient()
         
     def setUp(self):
+        caches['inventory'].clear()
         
         # add test data
         self.user = User.objects.create_user('authuser', 'a@b.com', 'password')
@@ -111,6 +148,92 @@ class AllFoodsTest(BaseViewTest):
         second_response = self.client.get(reverse("food-list"), **header)
         self.assertEqual(second_response.status_code, status.HTTP_304_NOT_MODIFIED, 'Status expectation failed')
     
+    def test_etag_skips_serialization(self):
+        
+        """
+        This test ensures that a matching ETag is answered with a single aggregate query when we make GET request to the /food endpoint
+        """
+        
+        # hit the API endpoint
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse("food-list"))
+        self.assertFalse(response.has_header("Last-Modified"), 'Response should not contain Last-Modified header')
+        
+        header = {"HTTP_IF_NONE_MATCH": response["ETag"] }
+        with self.assertNumQueries(1):
+            second_response = self.client.get(reverse("food-list"), **header)
+        self.assertEqual(second_response.status_code, status.HTTP_304_NOT_MODIFIED, 'Status expectation failed')
+        self.assertEqual(second_response["ETag"], response["ETag"])
+        
+    def test_etag_changes_after_update(self):
+        
+        """
+        This test ensures that foods are returned again after one of them has been updated when we make GET request with an ETag to the /food endpoint
+        """
+        
+        # hit the API endpoint
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse("food-list"))
+        food = Food.objects.filter(user=self.user).first()
+        self.client.patch(reverse('food-detail', kwargs={'pk': food.id}), {"is_on_stock": True})
+        
+        header = {"HTTP_IF_NONE_MATCH": response["ETag"] }
+        second_response = self.client.get(reverse("food-list"), **header)
+        self.assertEqual(second_response.status_code, status.HTTP_200_OK, 'Status expectation failed')
+        self.assertNotEqual(second_response["ETag"], response["ETag"])
+        
+    def test_if_modified_since_after_delete(self):
+        
+        """
+        This test ensures that foods are returned again after an older one has been deleted when we make GET request with If-Modified-Since to the /food endpoint
+        """
+        
+        # hit the API endpoint
+        self.client.force_authenticate(self.user)
+        food = Food.objects.filter(user=self.user).order_by("date_modified").first()
+        self.client.delete(reverse('food-detail', kwargs={'pk': food.id}))
+        
+        header = {"HTTP_IF_MODIFIED_SINCE": http_date(time.time() + 3600)}
+        response = self.client.get(reverse("food-list"), **header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, 'Status expectation failed')
+        self.assertNotIn(food.id, [item["id"] for item in response.data])
+        
+    def test_etag_changes_after_delete_and_create(self):
+        
+        """
+        This test ensures that the ETag changes when a delete and a create leave the count and the newest modification date as they were
+        """
+        
+        # foods modified ahead of the clock keep the newest date when another one is created
+        self.client.force_authenticate(self.user)
+        Food.objects.filter(user=self.user).update(date_modified=timezone.now() + timedelta(days=1))
+        response = self.client.get(reverse("food-list"))
+        food = Food.objects.filter(user=self.user).first()
+        self.client.delete(reverse('food-detail', kwargs={'pk': food.id}))
+        self.client.post(reverse('food-list'), {"name": "Bread", "description": ""})
+        
+        # hit the API endpoint
+        header = {"HTTP_IF_NONE_MATCH": response["ETag"]}
+        second_response = self.client.get(reverse("food-list"), **header)
+        self.assertEqual(second_response.status_code, status.HTTP_200_OK, 'Status expectation failed')
+        self.assertIn("Bread", [item["name"] for item in second_response.data])
+        
+    def test_etag_food(self):
+        
+        """
+        This test ensures that a food is not returned after its ETag has been sent when we make GET request to the /food/:id endpoint
+        """
+        
+        # hit the API endpoint
+        self.client.force_authenticate(self.user)
+        food = Food.objects.filter(user=self.user).first()
+        response = self.client.get(reverse('food-detail', kwargs={'pk': food.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        header = {"HTTP_IF_NONE_MATCH": response["ETag"] }
+        second_response = self.client.get(reverse('food-detail', kwargs={'pk': food.id}), **header)
+        self.assertEqual(second_response.status_code, status.HTTP_304_NOT_MODIFIED, 'Status expectation failed')
+    
 class LoginTest(BaseViewTest):
      
     def test_login(self):
@@ -124,6 +247,179 @@ class LoginTest(BaseViewTest):
         self.assertTrue(is_successful, 'Login should be successful')
         
     
+    def test_login_view(self):
+        
+        """
+        This test ensures that a token is returned when we make POST call to the auth/login/ endpoint
+        """
+        
+        # hit the API endpoint
+        response = APIClient().post(reverse('auth-login'), {"username": "user", "password": "password"})
+        
+        # check response
+        self.assertIsNotNone(response.data["token"], 'Response should contain a token')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+    def post_saturated(self, client, url, data):
+        
+        # occupy the only slot of the pool while posting
+        self.user.set_password('password')
+        self.user.save()
+        pool = HashingPool(workers=1, queue_size=0)
+        started = threading.Event()
+        release = threading.Event()
+        
+        def block():
+            started.set()
+            release.wait(5)
+        
+        thread = threading.Thread(target=pool.run, args=(block,))
+        thread.start()
+        started.wait(5)
+        try:
+            with mock.patch('inventory.hashers.hashing_pool', return_value=pool):
+                return client.post(url, data)
+        finally:
+            release.set()
+            thread.join()
+    
+    @override_settings(PASSWORD_HASHERS=['inventory.hashers.PooledPBKDF2PasswordHasher'])
+    def test_login_hashing_saturated(self):
+        
+        """
+        This test ensures that logins are rejected right away when the password hashing pool is saturated
+        """
+        
+        # hit the API endpoint
+        response = self.post_saturated(APIClient(), reverse('auth-login'), {"username": "user", "password": "password"})
+        
+        # check response
+        self.assertIsNotNone(response.data["message"], 'Response should contain error message')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+    @override_settings(PASSWORD_HASHERS=['inventory.hashers.PooledPBKDF2PasswordHasher'])
+    def test_token_auth_hashing_saturated(self):
+        
+        """
+        This test ensures that the api-token-auth/ endpoint answers a saturated password hashing pool with a 503
+        """
+        
+        # hit the API endpoint
+        response = self.post_saturated(APIClient(), reverse('create-token'), {"username": "user", "password": "password"})
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertIsNotNone(response.data["message"], 'Response should contain error message')
+        
+    @override_settings(PASSWORD_HASHERS=['inventory.hashers.PooledPBKDF2PasswordHasher'])
+    def test_admin_login_hashing_saturated(self):
+        
+        """
+        This test ensures that the views outside the API answer a saturated password hashing pool with a 503
+        """
+        
+        # hit the admin login
+        response = self.post_saturated(Client(), reverse('admin:login'), {"username": "user", "password": "password"})
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertIsNotNone(json.loads(response.content.decode())["message"], 'Response should contain error message')
+        
+    
+    @override_settings(INVENTORY={'STATELESS_LOGIN': True})
+    def test_stateless_login(self):
+        
+        """
+        This test ensures that no session is written when we make POST call to the auth/login/ endpoint in stateless mode
+        """
+        
+        # hit the API endpoint
+        with self.assertNumQueries(1):
+            response = APIClient().post(reverse('auth-login'), {"username": "user", "password": "password"})
+        
+        # check response
+        self.assertIsNotNone(response.data["token"], 'Response should contain a token')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Session.objects.exists(), 'No session should be saved')
+        
+    @override_settings(INVENTORY={'STATELESS_LOGIN': False})
+    def test_session_login(self):
+        
+        """
+        This test ensures that a session is written when we make POST call to the auth/login/ endpoint in session mode
+        """
+        
+        # hit the API endpoint
+        response = APIClient().post(reverse('auth-login'), {"username": "user", "password": "password"})
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(Session.objects.exists(), 'Session should be saved')
+        
+    def test_refresh_token(self):
+        
+        """
+        This test ensures that a token can be refreshed at the auth/refresh/ endpoint when JWT_ALLOW_REFRESH is enabled
+        """
+        
+        with mock.patch.object(jwt_settings, 'JWT_ALLOW_REFRESH', True):
+            token = APIClient().post(reverse('auth-login'), {"username": "user", "password": "password"}).data["token"]
+            
+            # hit the API endpoint
+            response = APIClient().post(reverse('auth-refresh'), {"token": token})
+        
+        # check response
+        self.assertIsNotNone(response.data["token"], 'Response should contain a token')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+    
+class CachedAuthenticationTest(BaseViewTest):
+    
+    def setUp(self):
+        super().setUp()
+        token_users.clear()
+        response = APIClient().post(reverse('auth-login'), {"username": "user", "password": "password"})
+        self.jwt_client = APIClient()
+        self.jwt_client.credentials(HTTP_AUTHORIZATION="JWT {}".format(response.data["token"]))
+        
+    def test_cached_user(self):
+        
+        """
+        This test ensures that the user of a token is fetched only once when we make GET calls with a JWT to the /food endpoint
+        """
+        
+        # hit the API endpoint
+        with CaptureQueriesContext(connection) as first_queries:
+            response = self.jwt_client.get(reverse("food-list"))
+        with CaptureQueriesContext(connection) as second_queries:
+            second_response = self.jwt_client.get(reverse("food-list"))
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(second_response.status_code, status.HTTP_200_OK)
+        user_table = User._meta.db_table
+        self.assertTrue(any(user_table in query["sql"] for query in first_queries), 'User should be fetched')
+        self.assertFalse(any(user_table in query["sql"] for query in second_queries), 'User should be read from the cache')
+        
+    def test_deactivated_user(self):
+        
+        """
+        This test ensures that a cached token is rejected once its user has been deactivated
+        """
+        
+        # hit the API endpoint
+        response = self.jwt_client.get(reverse("food-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save()
+        response = self.jwt_client.get(reverse("food-list"))
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        
+    
 class FoodCRUDTest(AuthenticatedViewTest):
     
     def test_create_food(self):
@@ -232,6 +528,23 @@ class FoodCRUDTest(AuthenticatedViewTest):
         self.assertEqual(response.data, serialized.data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         
+    @override_settings(INVENTORY={'BULK_CREATE_BATCH_SIZE': 2})
+    def test_create_food_batch_chunked(self):
+        
+        """
+        This test ensures that foods are created in chunks and returned in request order when we make POST call with a list to the /food endpoint
+        """
+        
+        # hit the API endpoint
+        names = ["food{}".format(idx) for idx in range(5)]
+        response = self.client.post(reverse('food-list'), [{"name": name, "description": "", "is_on_stock": True} for name in names])
+        
+        # check response
+        self.assertEqual([food["name"] for food in response.data], names)
+        self.assertTrue(all(food["is_on_stock"] for food in response.data), 'Foods should be created with the sent data')
+        self.assertEqual(Food.objects.filter(user=self.user).count(), len(names))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
     def test_partial_update_food_batch(self):
         
         """
@@ -250,6 +563,67 @@ class FoodCRUDTest(AuthenticatedViewTest):
         self.assertFalse(Food.objects.filter(name__in=food_names).exists(), 'Foods with these names should no longer exist')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         
+    @override_settings(INVENTORY={'BULK_UPDATE_BATCH_SIZE': 2})
+    def test_update_food_batch(self):
+        
+        """
+        This test ensures that multiple foods are updated and returned in ids order when we make PUT call to the foods-list/ endpoint
+        """
+        
+        foods = [Food.objects.create(user=self.user, name="name{}".format(idx), description="") for idx in range(3)]
+        
+        # hit the API endpoint
+        query = "?many=true&ids={},{},{}".format(foods[2].id, foods[0].id, foods[1].id)
+        data = [{"name": "tomato{}".format(idx), "description": "fresh", "is_on_stock": True} for idx in range(3)]
+        response = self.client.put(reverse('food-list')+query, data)
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([food["id"] for food in response.data], [foods[2].id, foods[0].id, foods[1].id])
+        self.assertEqual([food["name"] for food in response.data], ["tomato0", "tomato1", "tomato2"])
+        self.assertEqual(Food.objects.get(pk=foods[2].id).name, "tomato0")
+        self.assertEqual(Food.objects.filter(user=self.user, description="fresh", is_on_stock=True).count(), 3)
+        
+    def test_update_food_batch_parameter_limit(self):
+        
+        """
+        This test ensures that batch updates are split so no UPDATE statement goes over the parameter limit of the database
+        """
+        
+        foods = Food.objects.bulk_create([Food(user=self.user, name="name{}".format(idx), description="") for idx in range(150)])
+        ids = list(Food.objects.filter(user=self.user).values_list("id", flat=True))
+        
+        # hit the API endpoint
+        query = "?many=true&ids={}".format(",".join(str(food_id) for food_id in ids))
+        data = [{"name": "tomato{}".format(idx), "description": "fresh", "is_on_stock": True} for idx in range(len(ids))]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(reverse('food-list')+query, data)
+        
+        # check response, each row takes 9 parameters with 4 updated fields
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        updates = [query for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), -(-len(ids) // (connection.features.max_query_params // 9)) if connection.features.max_query_params else 1)
+        self.assertEqual(Food.objects.filter(user=self.user, description="fresh", is_on_stock=True).count(), len(foods))
+        
+    def test_unauthorized_update_food_batch(self):
+        
+        """
+        This test ensures that user is unable to update foods of other users when making PATCH call to the foods-list/ endpoint
+        """
+        
+        user = User.objects.create_user('username', 'email', 'password')
+        food = Food.objects.create(user=self.user, name="name", description="")
+        other_food = Food.objects.create(user=user, name="other", description="")
+        
+        # hit the API endpoint
+        query = "?many=true&ids={},{}".format(food.id, other_food.id)
+        response = self.client.patch(reverse('food-list')+query, [{"name": "tomato"}, {"name": "tomato1"}])
+        
+        # check response
+        self.assertIsNotNone(response.data['message'], 'Response should contain error message')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Food.objects.get(pk=food.id).name, "name", 'No food should be updated')
+        
     def test_food_name_unique(self):
         
         """
@@ -264,6 +638,39 @@ class FoodCRUDTest(AuthenticatedViewTest):
         self.assertIsNotNone(response.data['message'], 'Response should contain error message')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         
+    def test_food_batch_name_unique(self):
+        
+        """
+        This test ensures that user is unable to create foods with existing or repeated names when making POST call with a list to the /food endpoint
+        """
+        
+        # hit the API endpoint
+        Food.objects.create(user=self.user, name='tomato', description="")
+        existing_response = self.client.post(reverse('food-list'), [{"name": "ham", "description": ""}, {"name": "tomato", "description": ""}])
+        repeated_response = self.client.post(reverse('food-list'), [{"name": "ham", "description": ""}, {"name": "ham", "description": ""}])
+        
+        # check response
+        self.assertIsNotNone(existing_response.data['message'], 'Response should contain error message')
+        self.assertEqual(existing_response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNotNone(repeated_response.data['message'], 'Response should contain error message')
+        self.assertEqual(repeated_response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Food.objects.filter(name='ham').exists(), 'No food should be created')
+        
+    def test_food_batch_validation_queries(self):
+        
+        """
+        This test ensures that batch validation checks the names against the database with a single query
+        """
+        
+        request = APIRequestFactory().post(reverse('food-list'))
+        request.user = self.user
+        data = [{"name": "food{}".format(idx), "description": ""} for idx in range(50)]
+        serializer = FoodSerializer(data=data, many=True, context={'request': request})
+        
+        # check validation
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+        
     def test_unauthorized_update(self):
          
         """
@@ -279,5 +686,1458 @@ class FoodCRUDTest(AuthenticatedViewTest):
         # check response
         self.assertIsNotNone(response.data['message'], 'Response should contain error message')
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class FoodPaginationTest(AuthenticatedViewTest):
+    
+    def setUp(self):
+        super().setUp()
+        
+        # Some foods share the same date_modified to check the id tie breaker
+        same_date = timezone.now()
+        for idx in range(5):
+            Food.objects.create(user=self.user, name="food{}".format(idx), description="", date_modified=same_date)
+        
+    def test_paginate_foods(self):
+        
+        """
+        This test ensures that all foods can be fetched page by page when we make GET calls with a cursor to the /food endpoint
+        """
+        
+        # hit the API endpoint until there is no next page
+        names = []
+        query = "?page_size=2"
+        while True:
+            response = self.client.get(reverse("food-list") + query)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            names.extend(food["name"] for food in response.data["results"])
+            if response.data["next"] is None:
+                break
+            query = "?page_size=2&cursor={}".format(response.data["next"])
+        
+        # check response
+        expected = Food.objects.filter(user=self.user).order_by("date_modified", "id")
+        self.assertEqual(names, [food.name for food in expected])
+        
+    def test_invalid_cursor(self):
+        
+        """
+        This test ensures that an invalid cursor is rejected when we make GET call to the /food endpoint
+        """
+        
+        # hit the API endpoint
+        response = self.client.get(reverse("food-list") + "?cursor=invalid")
+        
+        # check response
+        self.assertIsNotNone(response.data['message'], 'Response should contain error message')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(INVENTORY={'RESPONSE_CACHE': 'inventory'})
+class FoodCacheTest(AuthenticatedViewTest):
+    
+    def test_cached_foods(self):
+        
+        """
+        This test ensures that the food list is served from the cache until a food is changed when we make GET calls to the /food endpoint
+        """
+        
+        food = Food.objects.create(user=self.user, name="tomato", description="")
+        stats = InventoryCache.stats.as_dict()
+        
+        # hit the API endpoint
+        response = self.client.get(reverse("food-list"))
+        with self.assertNumQueries(1):
+            cached_response = self.client.get(reverse("food-list"))
+        
+        # check response
+        self.assertEqual(cached_response.data, response.data)
+        self.assertEqual(InventoryCache.stats.as_dict()['misses'], stats['misses'] + 1)
+        self.assertEqual(InventoryCache.stats.as_dict()['hits'], stats['hits'] + 1)
+        
+        # change the food and check the list is fetched again
+        self.client.patch(reverse('food-detail', kwargs={'pk': food.id}), {"name": "ham"})
+        response = self.client.get(reverse("food-list"))
+        self.assertEqual(response.data[0]["name"], "ham")
+        
+    def test_cache_keyed_by_etag(self):
+        
+        """
+        This test ensures that a cached list is not served after a write whose invalidation did not reach the cache
+        """
+        
+        food = Food.objects.create(user=self.user, name="tomato", description="")
+        self.client.get(reverse("food-list"))
+        
+        # another process writes the food and its change, its cache version bump is lost
+        Food.objects.filter(id=food.id).update(name="ham")
+        record_changes(self.user, updated=[food.id])
+        
+        # hit the API endpoint
+        response = self.client.get(reverse("food-list"))
+        
+        # check response
+        self.assertEqual(response.data[0]["name"], "ham")
+        
+    def test_least_recently_used_evicted(self):
+        
+        """
+        This test ensures that the in-process cache backend evicts the least recently used entry once full
+        """
         
-        
\ No newline at end of file
+        cache = LRUCache("test-lru", {"OPTIONS": {"MAX_ENTRIES": 2}})
+        cache.clear()
+        cache.set("tomato", 1)
+        cache.set("ham", 2)
+        self.assertEqual(cache.get("tomato"), 1)
+        cache.set("eggs", 3)
+        
+        # check entries
+        self.assertIsNone(cache.get("ham"))
+        self.assertEqual(cache.get("tomato"), 1)
+        self.assertFalse(cache.add("tomato", 4))
+        self.assertEqual(cache.incr("tomato"), 2)
+        with self.assertRaises(ValueError):
+            cache.incr("ham")
+        
+    @override_settings(INVENTORY={'RESPONSE_CACHE': None})
+    def test_cache_disabled(self):
+        
+        """
+        This test ensures that the cache is not used when it is disabled in the settings
+        """
+        
+        stats = InventoryCache.stats.as_dict()
+        
+        # hit the API endpoint
+        response = self.client.get(reverse("food-list"))
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(InventoryCache.stats.as_dict(), stats)
+
+
+class FoodFastSerializerTest(AuthenticatedViewTest):
+    
+    def setUp(self):
+        super().setUp()
+        Food.objects.create(user=self.user, name="tomato", description="")
+        Food.objects.create(user=self.user, name="paprika", description="piros \u00e9s \"\u00e9des\"", is_on_stock=True)
+        Food.objects.create(user=self.user, name="ham", description="sliced", date_modified=timezone.now().replace(microsecond=0))
+    
+    def assertRenderedEqual(self, first, second):
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(first), renderer.render(second))
+    
+    def test_parity(self):
+        
+        """
+        This test ensures that the fast serializer renders the same bytes as FoodSerializer
+        """
+        
+        foods = Food.objects.filter(user=self.user)
+        self.assertRenderedEqual(FoodFastSerializer(foods, many=True).data, FoodSerializer(foods, many=True).data)
+        self.assertRenderedEqual(FoodFastSerializer(list(foods), many=True).data, FoodSerializer(foods, many=True).data)
+        self.assertRenderedEqual(FoodFastSerializer(foods[0]).data, FoodSerializer(foods[0]).data)
+        
+    @override_settings(TIME_ZONE='Europe/Budapest')
+    def test_parity_time_zone(self):
+        
+        """
+        This test ensures that the fast serializer renders dates in the current time zone like FoodSerializer
+        """
+        
+        foods = Food.objects.filter(user=self.user)
+        self.assertRenderedEqual(FoodFastSerializer(foods, many=True).data, FoodSerializer(foods, many=True).data)
+
+
+@override_settings(INVENTORY={'STREAM_CHUNK_SIZE': 2})
+class FoodStreamTest(AuthenticatedViewTest):
+    
+    def setUp(self):
+        super().setUp()
+        for idx in range(5):
+            Food.objects.create(user=self.user, name="food{}".format(idx), description="")
+    
+    def test_stream_foods(self):
+        
+        """
+        This test ensures that the streamed food list matches the regular one when we make GET call with stream param to the /food endpoint
+        """
+        
+        # hit the API endpoint
+        response = self.client.get(reverse("food-list") + "?stream=1")
+        
+        # check response
+        self.assertTrue(response.streaming, 'Response should be streamed')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = FoodSerializer(Food.objects.filter(user=self.user), many=True).data
+        self.assertEqual(b"".join(response.streaming_content), JSONRenderer().render(expected))
+        
+    def test_stream_foods_ndjson(self):
+        
+        """
+        This test ensures that foods are streamed one per line when we make GET call accepting NDJSON to the /food endpoint
+        """
+        
+        # hit the API endpoint
+        response = self.client.get(reverse("food-list"), HTTP_ACCEPT="application/x-ndjson")
+        
+        # check response
+        self.assertTrue(response.streaming, 'Response should be streamed')
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).splitlines()
+        expected = FoodSerializer(Food.objects.filter(user=self.user), many=True).data
+        self.assertEqual([json.loads(line.decode("utf-8")) for line in lines], expected)
+
+
+class FoodFilterTest(AuthenticatedViewTest):
+    
+    def setUp(self):
+        super().setUp()
+        self.date = timezone.now()
+        Food.objects.create(user=self.user, name="Tomato", description="", is_on_stock=True, date_modified=self.date - timedelta(days=2))
+        Food.objects.create(user=self.user, name="Potato", description="", date_modified=self.date - timedelta(days=1))
+        Food.objects.create(user=self.user, name="Tomatillo", description="", date_modified=self.date)
+    
+    def get_names(self, query):
+        response = self.client.get(reverse("food-list") + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(food["name"] for food in response.data)
+    
+    def test_filter_foods(self):
+        
+        """
+        This test ensures that foods are filtered in the database when we make GET call with filter params to the /food endpoint
+        """
+        
+        # hit the API endpoint and check response
+        self.assertEqual(self.get_names("?is_on_stock=false"), ["Potato", "Tomatillo"])
+        self.assertEqual(self.get_names("?name=tom"), ["Tomatillo", "Tomato"])
+        self.assertEqual(self.get_names("?search=ato"), ["Potato", "Tomato"])
+        self.assertEqual(self.get_names("?is_on_stock=false&name=tom"), ["Tomatillo"])
+        query = "?" + urlencode({"modified_since": (self.date - timedelta(days=1)).isoformat()})
+        self.assertEqual(self.get_names(query), ["Potato", "Tomatillo"])
+        
+    def test_invalid_filter(self):
+        
+        """
+        This test ensures that invalid filter params are rejected when we make GET call to the /food endpoint
+        """
+        
+        # hit the API endpoint
+        stock_response = self.client.get(reverse("food-list") + "?is_on_stock=maybe")
+        date_response = self.client.get(reverse("food-list") + "?modified_since=yesterday")
+        
+        # check response
+        self.assertIsNotNone(stock_response.data['message'], 'Response should contain error message')
+        self.assertEqual(stock_response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNotNone(date_response.data['message'], 'Response should contain error message')
+        self.assertEqual(date_response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FoodUpsertTest(AuthenticatedViewTest):
+    
+    def test_upsert_foods(self):
+        
+        """
+        This test ensures that foods are created or updated by name when we make POST call to the /food/upsert endpoint
+        """
+        
+        tomato = Food.objects.create(user=self.user, name="tomato", description="red")
+        other_user = User.objects.create_user('other', 'o@b.com', 'password')
+        Food.objects.create(user=other_user, name="ham", description="other")
+        
+        # hit the API endpoint
+        data = [
+            {"name": "tomato", "description": "green", "is_on_stock": True},
+            {"name": "ham", "description": "smoked", "is_on_stock": False},
+        ]
+        response = self.client.post(reverse("food-upsert"), data)
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"created": 1, "updated": 1})
+        tomato.refresh_from_db()
+        self.assertEqual((tomato.description, tomato.is_on_stock), ("green", True))
+        self.assertEqual(Food.objects.get(user=self.user, name="ham").description, "smoked")
+        self.assertEqual(Food.objects.get(user=other_user, name="ham").description, "other")
+        
+        # the changes are reported by sync
+        changes = self.client.get(reverse("food-sync")).data
+        self.assertEqual(sorted(food["name"] for food in changes["created"]), ["ham", "tomato"])
+        
+    def test_upsert_many_foods(self):
+        
+        """
+        This test ensures that upserts larger than the parameter limit of the database are split into batches
+        """
+        
+        Food.objects.bulk_create([Food(user=self.user, name="food{}".format(idx), description="") for idx in range(300)])
+        
+        # hit the API endpoint
+        data = [{"name": "food{}".format(idx), "description": "upserted", "is_on_stock": True} for idx in range(600)]
+        response = self.client.post(reverse("food-upsert"), data)
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"created": 300, "updated": 300})
+        self.assertEqual(Food.objects.filter(user=self.user, description="upserted", is_on_stock=True).count(), 600)
+        
+    def test_upsert_on_conflict(self):
+        
+        """
+        This test ensures that INSERT ... ON CONFLICT reports the created and the updated rows apart in capped batches
+        """
+        
+        if connection.vendor != "postgresql":
+            self.skipTest("PostgreSQL only")
+        existing = Food.objects.create(user=self.user, name="food0", description="")
+        
+        # more parameters than PostgreSQL accepts in a statement if the batch size was not capped
+        foods = [Food(user=self.user, name="food{}".format(idx), description="upserted") for idx in range(15000)]
+        created, updated = bulk_upsert(Food.objects.all(), foods, ('user', 'name'), ['description'], batch_size=15000)
+        
+        # check the rows
+        self.assertEqual(updated, [existing.id])
+        self.assertEqual(len(created), 14999)
+        self.assertEqual(Food.objects.filter(user=self.user, description="upserted").count(), 15000)
+        
+    def test_upsert_invalid_foods(self):
+        
+        """
+        This test ensures that duplicate names, mixed fields and single objects are rejected by the /food/upsert endpoint
+        """
+        
+        # hit the API endpoint
+        duplicate_response = self.client.post(reverse("food-upsert"), [{"name": "ham", "description": ""}, {"name": "ham", "description": ""}])
+        mixed_response = self.client.post(reverse("food-upsert"), [{"name": "ham", "description": ""}, {"name": "eggs", "description": "", "is_on_stock": True}])
+        single_response = self.client.post(reverse("food-upsert"), {"name": "ham", "description": ""})
+        
+        # check response
+        for response in (duplicate_response, mixed_response, single_response):
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("message", response.data)
+        self.assertFalse(Food.objects.filter(user=self.user).exists())
+        
+        
+class FoodDeleteListTest(AuthenticatedViewTest):
+    
+    def test_delete_foods_by_ids(self):
+        
+        """
+        This test ensures that only the user's foods of the ids param are deleted when we make DELETE call to the /food?ids= endpoint
+        """
+        
+        tomato = Food.objects.create(user=self.user, name="tomato", description="")
+        ham = Food.objects.create(user=self.user, name="ham", description="")
+        eggs = Food.objects.create(user=self.user, name="eggs", description="")
+        other_user = User.objects.create_user('other', 'o@b.com', 'password')
+        other_food = Food.objects.create(user=other_user, name="ham", description="")
+        
+        # hit the API endpoint
+        query = "?ids={},{},{},999999".format(tomato.id, ham.id, other_food.id)
+        response = self.client.delete(reverse("food-list") + query)
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(response.data["deleted"]), sorted([tomato.id, ham.id]))
+        self.assertEqual(list(Food.objects.filter(user=self.user)), [eggs])
+        self.assertTrue(Food.objects.filter(pk=other_food.id).exists())
+        
+        # the deletions are reported by sync
+        sync = self.client.get(reverse("food-sync")).data
+        changes = self.client.get(reverse("food-sync") + "?since=0").data
+        self.assertEqual(sorted(changes["deleted"]), sorted([tomato.id, ham.id]))
+        self.assertEqual([food["name"] for food in sync["created"]], ["eggs"])
+        
+    def test_delete_foods_invalid_ids(self):
+        
+        """
+        This test ensures that malformed ids are rejected by the DELETE /food?ids= endpoint
+        """
+        
+        food = Food.objects.create(user=self.user, name="tomato", description="")
+        
+        # hit the API endpoint
+        response = self.client.delete(reverse("food-list") + "?ids={},abc".format(food.id))
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("message", response.data)
+        self.assertTrue(Food.objects.filter(pk=food.id).exists())
+        
+        
+class FoodStockTest(AuthenticatedViewTest):
+    
+    def setUp(self):
+        super().setUp()
+        self.tomato = Food.objects.create(user=self.user, name="tomato", description="")
+        self.ham = Food.objects.create(user=self.user, name="ham", description="", is_on_stock=True)
+    
+    def test_set_food_stock(self):
+        
+        """
+        This test ensures that the stock state of a food is changed with one UPDATE when we make PUT call to the /food/:id/stock endpoint
+        """
+        
+        # hit the API endpoint
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(reverse("food-stock", kwargs={"pk": self.tomato.id}), {"is_on_stock": True})
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"id": self.tomato.id, "is_on_stock": True})
+        self.assertEqual(len([query for query in queries if query["sql"].startswith("UPDATE")]), 1)
+        self.tomato.refresh_from_db()
+        self.assertTrue(self.tomato.is_on_stock)
+        changes = self.client.get(reverse("food-sync") + "?since=0").data
+        self.assertEqual([food["id"] for food in changes["updated"]], [self.tomato.id])
+        
+    def test_set_food_stock_errors(self):
+        
+        """
+        This test ensures that unknown foods and invalid states are rejected by the /food/:id/stock endpoint
+        """
+        
+        # hit the API endpoint
+        not_found_response = self.client.put(reverse("food-stock", kwargs={"pk": 999999}), {"is_on_stock": True})
+        invalid_response = self.client.put(reverse("food-stock", kwargs={"pk": self.tomato.id}), {"is_on_stock": "maybe"})
+        
+        # check response
+        self.assertEqual(not_found_response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(invalid_response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("message", invalid_response.data)
+        
+    def test_set_foods_stock(self):
+        
+        """
+        This test ensures that only the foods whose state differs are updated when we make PUT call to the /food/stock?ids= endpoint
+        """
+        
+        # hit the API endpoint
+        query = "?ids={},{}".format(self.tomato.id, self.ham.id)
+        response = self.client.put(reverse("food-stock-list") + query, {"is_on_stock": True})
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"updated": [self.tomato.id]})
+        self.assertEqual(Food.objects.filter(user=self.user, is_on_stock=True).count(), 2)
+        
+    @override_settings(INVENTORY={'STOCK_COALESCE_WINDOW': 60})
+    def test_coalesce_stock_changes(self):
+        
+        """
+        This test ensures that repeated stock changes within the coalescing window are written once with the last state
+        """
+        
+        # hit the API endpoint
+        url = reverse("food-stock", kwargs={"pk": self.tomato.id})
+        responses = [self.client.put(url, {"is_on_stock": is_on_stock}) for is_on_stock in (True, False, True)]
+        self.client.put(reverse("food-stock", kwargs={"pk": self.ham.id}), {"is_on_stock": False})
+        self.client.put(reverse("food-stock", kwargs={"pk": self.ham.id}), {"is_on_stock": True})
+        
+        # check response
+        self.assertEqual([response.status_code for response in responses], [status.HTTP_202_ACCEPTED] * 3)
+        self.tomato.refresh_from_db()
+        self.assertFalse(self.tomato.is_on_stock)
+        
+        # write the buffered states
+        with CaptureQueriesContext(connection) as queries:
+            stock_buffer().flush()
+        self.assertEqual(len([query for query in queries if query["sql"].startswith("UPDATE")]), 1)
+        self.tomato.refresh_from_db()
+        self.ham.refresh_from_db()
+        self.assertTrue(self.tomato.is_on_stock)
+        self.assertTrue(self.ham.is_on_stock)
+        
+        
+    @override_settings(INVENTORY={'STOCK_COALESCE_WINDOW': 60})
+    def test_write_discards_pending_stock(self):
+        
+        """
+        This test ensures that buffered stock states are dropped when the foods are written with an is_on_stock by another endpoint
+        """
+        
+        eggs = Food.objects.create(user=self.user, name="eggs", description="")
+        for food in (self.tomato, self.ham, eggs):
+            self.client.put(reverse("food-stock", kwargs={"pk": food.id}), {"is_on_stock": food.id != self.ham.id})
+        
+        # hit the API endpoint
+        patch_response = self.client.patch(reverse("food-detail", kwargs={"pk": self.tomato.id}), {"is_on_stock": False})
+        upsert_response = self.client.post(reverse("food-upsert"), [{"name": "ham", "description": "", "is_on_stock": True}])
+        self.client.patch(reverse("food-detail", kwargs={"pk": eggs.id}), {"description": "brown"})
+        stock_buffer().flush()
+        
+        # check the written states were kept, the food written without a state still gets its buffered one
+        self.assertEqual(patch_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(upsert_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            dict(Food.objects.filter(user=self.user).values_list("name", "is_on_stock")),
+            {"tomato": False, "ham": True, "eggs": True},
+        )
+        
+    def test_flush_failure_requeued(self):
+        
+        """
+        This test ensures that a failed write of a user's buffered stock states does not drop the states of the other users
+        """
+        
+        other_user = User.objects.create(username="other")
+        other_food = Food.objects.create(user=other_user, name="eggs", description="")
+        buffer = StockBuffer(60)
+        buffer.add(self.user, {self.tomato.id: True, self.ham.id: False})
+        buffer.add(other_user, {other_food.id: True})
+        
+        def fail_for_user(user, values):
+            if user == self.user:
+                buffer.add(self.user, {self.ham.id: True})
+                raise DatabaseError("database is locked")
+            return set_stock(user, values)
+        
+        # write the buffered states
+        with mock.patch("inventory.stock.set_stock", side_effect=fail_for_user), self.assertLogs("inventory.stock", "ERROR"):
+            buffer.flush()
+        
+        # check the other user's states were written and the failed ones kept without overwriting the newer state
+        try:
+            other_food.refresh_from_db()
+            self.assertTrue(other_food.is_on_stock)
+            self.assertEqual(buffer.pending[self.user.pk][1], {self.tomato.id: True, self.ham.id: True})
+            self.assertIsNotNone(buffer.timer, 'The failed states should be retried')
+        finally:
+            buffer.timer.cancel()
+        
+    @override_settings(INVENTORY={'STOCK_COALESCE_WINDOW': 60})
+    def test_flush_at_exit(self):
+        
+        """
+        This test ensures that the stock states still buffered are written when the process stops
+        """
+        
+        with mock.patch("inventory.stock._buffer", None), mock.patch("inventory.stock.atexit.register") as register:
+            buffer = stock_buffer()
+        register.assert_called_once_with(buffer.flush)
+        
+        
+class FoodFieldsTest(AuthenticatedViewTest):
+    
+    def setUp(self):
+        super().setUp()
+        self.tomato = Food.objects.create(user=self.user, name="tomato", description="red")
+        self.ham = Food.objects.create(user=self.user, name="ham", description="smoked")
+    
+    def test_list_fields(self):
+        
+        """
+        This test ensures that only the requested fields are returned when we make GET call to the /food?fields= endpoint
+        """
+        
+        # hit the API endpoint
+        response = self.client.get(reverse("food-list") + "?fields=is_on_stock,id,name")
+        page_response = self.client.get(reverse("food-list") + "?fields=id&page_size=1")
+        stream_response = self.client.get(reverse("food-list") + "?fields=name&stream=1")
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(response.data, key=lambda food: food["id"]), [
+            {"name": "tomato", "is_on_stock": False, "id": self.tomato.id},
+            {"name": "ham", "is_on_stock": False, "id": self.ham.id},
+        ])
+        self.assertEqual(list(response.data[0]), ["name", "is_on_stock", "id"])
+        self.assertEqual(page_response.data["results"], [{"id": self.tomato.id}])
+        self.assertIsNotNone(page_response.data["next"])
+        streamed = json.loads(b"".join(stream_response.streaming_content).decode("utf-8"))
+        self.assertEqual(sorted(food["name"] for food in streamed), ["ham", "tomato"])
+        self.assertEqual(set(streamed[0]), {"name"})
+        
+    def test_list_fields_deferred(self):
+        
+        """
+        This test ensures that paginating a list restricted by fields does not load the deferred columns row by row
+        """
+        
+        # hit the API endpoint
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("food-list") + "?fields=name&page_size=10")
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [{"name": "tomato"}, {"name": "ham"}])
+        
+    def test_retrieve_and_write_fields(self):
+        
+        """
+        This test ensures that retrieve, batch creation, update and batch update return only the requested fields
+        """
+        
+        # hit the API endpoint
+        retrieve_response = self.client.get(reverse("food-detail", kwargs={"pk": self.tomato.id}) + "?fields=description")
+        create_response = self.client.post(reverse("food-list") + "?fields=id", [{"name": "eggs", "description": ""}])
+        query = "?many=true&ids={}&fields=name,is_on_stock".format(self.ham.id)
+        update_response = self.client.patch(reverse("food-list") + query, [{"is_on_stock": True}])
+        detail_response = self.client.patch(reverse("food-detail", kwargs={"pk": self.tomato.id}) + "?fields=name", {"description": "green"})
+        
+        # check response
+        self.assertEqual(retrieve_response.data, {"description": "red"})
+        self.assertEqual(detail_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(detail_response.data, {"name": "tomato"})
+        self.assertEqual(create_response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(create_response.data, [{"id": Food.objects.get(user=self.user, name="eggs").id}])
+        self.assertEqual(update_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(update_response.data, [{"name": "ham", "is_on_stock": True}])
+        
+    def test_unknown_fields(self):
+        
+        """
+        This test ensures that unknown fields are rejected before anything is written
+        """
+        
+        # hit the API endpoint
+        list_response = self.client.get(reverse("food-list") + "?fields=id,price")
+        query = "?many=true&ids={}&fields=price".format(self.ham.id)
+        update_response = self.client.patch(reverse("food-list") + query, [{"is_on_stock": True}])
+        
+        # check response
+        self.assertEqual(list_response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("message", list_response.data)
+        self.assertEqual(update_response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.ham.refresh_from_db()
+        self.assertFalse(self.ham.is_on_stock)
+        
+        
+class FoodSyncTest(AuthenticatedViewTest):
+    
+    def sync(self, token=None):
+        query = "" if token is None else "?since={}".format(token)
+        response = self.client.get(reverse("food-sync") + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+    
+    def test_write_rolled_back_without_change(self):
+        
+        """
+        This test ensures that a food is not written when its change can't be recorded, so sync never misses a write
+        """
+        
+        food = Food.objects.create(user=self.user, name="tomato", description="")
+        
+        # hit the API endpoint
+        with mock.patch("inventory.notifications.record_changes", side_effect=DatabaseError("change log unavailable")):
+            with self.assertRaises(DatabaseError):
+                self.client.patch(reverse('food-detail', kwargs={'pk': food.id}), {"name": "ham"})
+        
+        # check the food
+        food.refresh_from_db()
+        self.assertEqual(food.name, "tomato")
+        
+    def test_writer_locks_user(self):
+        
+        """
+        This test ensures that the writes of a user lock the user row so they commit in the order of their sync tokens
+        """
+        
+        if not connection.features.has_select_for_update:
+            self.skipTest("SELECT ... FOR UPDATE not supported")
+        
+        # hit the API endpoint
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('food-list'), {"name": "tomato", "description": ""})
+        
+        # check the lock is taken before the food is written
+        statements = [query["sql"] for query in queries]
+        lock = next(idx for idx, sql in enumerate(statements) if sql.endswith("FOR UPDATE"))
+        insert = next(idx for idx, sql in enumerate(statements) if sql.startswith("INSERT"))
+        self.assertLess(lock, insert)
+        
+    def test_sync_foods(self):
+        
+        """
+        This test ensures that only the changes since the token are returned when we make GET call to the /food/sync endpoint
+        """
+        
+        # first sync returns the whole inventory
+        self.client.post(reverse('food-list'), [{"name": "tomato", "description": ""}, {"name": "ham", "description": ""}])
+        data = self.sync()
+        self.assertTrue(data["cleared"])
+        self.assertEqual(sorted(food["name"] for food in data["created"]), ["ham", "tomato"])
+        tomato, ham = sorted(data["created"], key=lambda food: food["name"], reverse=True)
+        
+        # nothing changed
+        self.assertEqual(self.sync(data["token"]), {"token": data["token"], "cleared": False, "created": [], "updated": [], "deleted": []})
+        
+        # change the inventory
+        self.client.patch(reverse('food-detail', kwargs={'pk': tomato["id"]}), {"is_on_stock": True})
+        self.client.delete(reverse('food-detail', kwargs={'pk': ham["id"]}))
+        self.client.post(reverse('food-list'), {"name": "eggs", "description": ""})
+        self.client.post(reverse('food-list'), {"name": "butter", "description": ""})
+        butter = Food.objects.get(user=self.user, name="butter")
+        self.client.delete(reverse('food-detail', kwargs={'pk': butter.id}))
+        
+        # check response
+        changes = self.sync(data["token"])
+        self.assertFalse(changes["cleared"])
+        self.assertEqual([food["name"] for food in changes["created"]], ["eggs"])
+        self.assertEqual([food["id"] for food in changes["updated"]], [tomato["id"]])
+        self.assertTrue(changes["updated"][0]["is_on_stock"])
+        self.assertEqual(changes["deleted"], [ham["id"]], 'Foods created and deleted since the token should be left out')
+        self.assertGreater(changes["token"], data["token"])
+        
+    def test_sync_cleared_foods(self):
+        
+        """
+        This test ensures that deleting all foods is reported by the /food/sync endpoint
+        """
+        
+        self.client.post(reverse('food-list'), {"name": "tomato", "description": ""})
+        token = self.sync()["token"]
+        
+        # hit the API endpoint
+        self.client.delete(reverse("food-list") + "?clear=true")
+        self.client.post(reverse('food-list'), {"name": "ham", "description": ""})
+        
+        # check response
+        changes = self.sync(token)
+        self.assertTrue(changes["cleared"])
+        self.assertEqual([food["name"] for food in changes["created"]], ["ham"])
+        
+    def test_clear_drops_older_changes(self):
+        
+        """
+        This test ensures that deleting all foods replaces the user's change log with the clear
+        """
+        
+        self.client.post(reverse('food-list'), [{"name": "tomato", "description": ""}, {"name": "ham", "description": ""}])
+        token = self.sync()["token"]
+        
+        # hit the API endpoint
+        self.client.delete(reverse("food-list") + "?clear=true")
+        
+        # check the change log
+        self.assertEqual(list(FoodChange.objects.filter(user=self.user).values_list("action", flat=True)), [FoodChange.CLEARED])
+        changes = self.sync(token)
+        self.assertTrue(changes["cleared"])
+        self.assertEqual(changes["created"], [])
+        
+    def test_sync_compacted_token(self):
+        
+        """
+        This test ensures that a token older than the compacted changes gets the whole inventory from the /food/sync endpoint
+        """
+        
+        self.client.post(reverse('food-list'), {"name": "tomato", "description": ""})
+        old_token = self.sync()["token"]
+        for name in ("ham", "eggs", "butter"):
+            self.client.post(reverse('food-list'), {"name": name, "description": ""})
+        recent_token = self.sync()["token"]
+        self.client.post(reverse('food-list'), {"name": "milk", "description": ""})
+        
+        # compact the change log
+        out = io.StringIO()
+        call_command("compact_changes", retention=2, stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Removed 3 changes")
+        self.assertEqual(FoodChange.objects.filter(user=self.user).exclude(action=FoodChange.PRUNED).count(), 2)
+        self.assertEqual(compact_changes(self.user, 2), 0, 'The pruned change should not count against the retention')
+        
+        # check response
+        changes = self.sync(old_token)
+        self.assertTrue(changes["cleared"])
+        self.assertEqual(sorted(food["name"] for food in changes["created"]), ["butter", "eggs", "ham", "milk", "tomato"])
+        changes = self.sync(recent_token)
+        self.assertFalse(changes["cleared"])
+        self.assertEqual([food["name"] for food in changes["created"]], ["milk"])
+        
+    def test_invalid_token(self):
+        
+        """
+        This test ensures that an invalid token is rejected by the /food/sync endpoint
+        """
+        
+        # hit the API endpoint
+        response = self.client.get(reverse("food-sync") + "?since=abc")
+        
+        # check response
+        self.assertIsNotNone(response.data['message'], 'Response should contain error message')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FoodChangesTest(AuthenticatedViewTest):
+    
+    def test_changes_long_poll(self):
+        
+        """
+        This test ensures that a long-poll returns at once when foods changed since the token when we make GET call to the /food/changes endpoint
+        """
+        
+        token = self.client.get(reverse("food-changes") + "?timeout=0").data["token"]
+        self.client.post(reverse('food-list'), {"name": "tomato", "description": ""})
+        
+        # hit the API endpoint
+        response = self.client.get(reverse("food-changes") + "?since={}".format(token))
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["changed"])
+        self.assertGreater(response.data["token"], token)
+        
+    def test_changes_timeout(self):
+        
+        """
+        This test ensures that a long-poll without changes returns once the timeout elapses when we make GET call to the /food/changes endpoint
+        """
+        
+        self.client.post(reverse('food-list'), {"name": "tomato", "description": ""})
+        token = self.client.get(reverse("food-sync")).data["token"]
+        
+        # hit the API endpoint
+        response = self.client.get(reverse("food-changes") + "?since={}&timeout=0.05".format(token))
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"token": token, "changed": False})
+        
+    def test_changes_invalid_timeout(self):
+        
+        """
+        This test ensures that timeouts which are not a finite number of seconds are rejected by the /food/changes endpoint
+        """
+        
+        # hit the API endpoint
+        responses = [self.client.get(reverse("food-changes") + "?timeout={}".format(timeout)) for timeout in ("soon", "nan", "inf", "-inf")]
+        
+        # check response
+        for response in responses:
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("message", response.data)
+        
+    @override_settings(INVENTORY={'LONG_POLL_TIMEOUT': 0.05, 'EVENT_STREAM_DURATION': 0.2})
+    def test_changes_event_stream(self):
+        
+        """
+        This test ensures that changes are sent as Server-Sent Events when we make GET call accepting text/event-stream to the /food/changes endpoint
+        """
+        
+        self.client.post(reverse('food-list'), {"name": "tomato", "description": ""})
+        
+        # hit the API endpoint
+        response = self.client.get(reverse("food-changes") + "?since=0", HTTP_ACCEPT="text/event-stream")
+        events = b"".join(response.streaming_content).decode("utf-8").split("\n\n")
+        
+        # check response
+        token = self.client.get(reverse("food-sync")).data["token"]
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(events[0], 'id: {0}\nevent: change\ndata: {{"token":{0}}}'.format(token))
+        self.assertIn(": keep-alive", events[1:])
+        
+    @override_settings(INVENTORY={'LONG_POLL_TIMEOUT': 60, 'EVENT_STREAM_DURATION': 60})
+    def test_changes_event_stream_disconnect(self):
+        
+        """
+        This test ensures that the event stream ends once the client has disconnected
+        """
+        
+        disconnected = threading.Event()
+        disconnected.set()
+        
+        # hit the API endpoint
+        start = time.monotonic()
+        response = self.client.get(reverse("food-changes"), HTTP_ACCEPT="text/event-stream", **{"foodstock.disconnected": disconnected})
+        content = b"".join(response.streaming_content)
+        
+        # check response
+        self.assertEqual(content, b"")
+        self.assertLess(time.monotonic() - start, 5)
+        
+    def test_changes_async_content(self):
+        
+        """
+        This test ensures that a long-poll waits on the event loop when the server produces the content there
+        """
+        
+        token = self.client.get(reverse("food-changes") + "?timeout=0").data["token"]
+        
+        # hit the API endpoint
+        response = self.client.get(reverse("food-changes") + "?since={}&timeout=5".format(token), **{"foodstock.async_content": True})
+        self.assertIsInstance(response, AsyncContentResponse)
+        self.assertEqual(response["Content-Type"], "application/json")
+        
+        # a change published while the coroutine waits wakes it up, the token is read on the executor
+        async def read():
+            return b"".join([chunk async for chunk in response.async_content()])
+        
+        loop = asyncio.get_event_loop()
+        loop.call_later(0.05, notification_broker().publish, self.user.pk)
+        with mock.patch("inventory.notifications.read_latest_token", side_effect=[token, token + 1]):
+            content = loop.run_until_complete(asyncio.wait_for(read(), 5))
+        
+        # check response
+        self.assertEqual(json.loads(content.decode("utf-8")), {"token": token + 1, "changed": True})
+        
+    def test_wait_for_changes_timeout_reads_token(self):
+        
+        """
+        This test ensures that a change whose notification did not reach the broker is returned once the wait times out
+        """
+        
+        with mock.patch("inventory.notifications.latest_token", side_effect=[5, 6]):
+            token = wait_for_changes(self.user, 5, 0.01)
+        self.assertEqual(token, 6)
+
+
+class NotificationBrokerTest(SimpleTestCase):
+    
+    def assertWakesUp(self, broker):
+        version = broker.version(1)
+        publisher = threading.Timer(0.05, broker.publish, args=(1,))
+        publisher.start()
+        new_version = broker.wait(1, version, 5)
+        publisher.join()
+        self.assertNotEqual(new_version, version, 'Waiter should be woken up by publish')
+        self.assertEqual(broker.wait(1, new_version, 0.01), new_version, 'Waiter should time out without publish')
+    
+    def assertWakesUpAsync(self, broker):
+        loop = asyncio.get_event_loop()
+        version = broker.version(1)
+        publisher = threading.Timer(0.05, broker.publish, args=(1,))
+        publisher.start()
+        new_version = loop.run_until_complete(asyncio.wait_for(broker.async_wait(1, version, 5), 5))
+        publisher.join()
+        self.assertNotEqual(new_version, version, 'Coroutine should be woken up by publish')
+        self.assertEqual(loop.run_until_complete(broker.async_wait(1, new_version, 0.01)), new_version, 'Coroutine should time out without publish')
+    
+    def test_local_broker(self):
+        
+        """
+        This test ensures that the in-process broker wakes up the waiters of a user
+        """
+        
+        self.assertWakesUp(LocalBroker())
+        self.assertWakesUpAsync(LocalBroker())
+        
+    def test_local_broker_other_user(self):
+        
+        """
+        This test ensures that the in-process broker does not wake up the waiters of the other users
+        """
+        
+        broker = LocalBroker()
+        version = broker.version(1)
+        with mock.patch.object(broker.condition(1), "notify_all") as notify_all:
+            broker.publish(2)
+        notify_all.assert_not_called()
+        self.assertEqual(broker.wait(1, version, 0.01), version)
+        
+    @override_settings(INVENTORY={'NOTIFICATION_POLL_INTERVAL': 0.01})
+    def test_cache_broker(self):
+        
+        """
+        This test ensures that the cache backed broker wakes up the waiters of a user
+        """
+        
+        caches['inventory'].clear()
+        self.assertWakesUp(CacheBroker())
+        self.assertWakesUpAsync(CacheBroker())
+    
+
+class ASGITest(SimpleTestCase):
+    
+    def call(self, method, path, body=b"", headers=()):
+        messages = []
+        received = []
+        
+        async def receive():
+            
+            # Like ASGI servers, wait for the client to go away once the body was received
+            if received:
+                await asyncio.get_event_loop().create_future()
+            received.append(True)
+            return {"type": "http.request", "body": body, "more_body": False}
+        
+        async def send(message):
+            messages.append(message)
+        
+        scope = {
+            "type": "http",
+            "http_version": "1.1",
+            "method": method,
+            "path": path,
+            "query_string": b"",
+            "headers": [(b"host", b"testserver")] + list(headers),
+        }
+        asyncio.get_event_loop().run_until_complete(asgi.application(scope, receive, send))
+        body = b"".join(message.get("body", b"") for message in messages if message["type"] == "http.response.body")
+        return messages[0]["status"], dict(messages[0]["headers"]), body
+    
+    def test_asgi_get(self):
+        
+        """
+        This test ensures that the API answers through the ASGI application
+        """
+        
+        status_code, headers, body = self.call("GET", reverse("food-list"))
+        
+        # check response
+        self.assertEqual(status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(headers[b"content-type"], b"application/json")
+        self.assertIn(b"detail", body)
+        
+    def test_asgi_post(self):
+        
+        """
+        This test ensures that request bodies are passed to the API by the ASGI application
+        """
+        
+        body = json.dumps({"username": "", "password": "", "email": ""}).encode("utf-8")
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii"))]
+        status_code, headers, body = self.call("POST", reverse("auth-register"), body, headers)
+        
+        # check response
+        self.assertEqual(status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(b"message", body)
+
+
+    def test_asgi_disconnect(self):
+        
+        """
+        This test ensures that a streaming response is stopped and closed when the client disconnects
+        """
+        
+        closed = threading.Event()
+        
+        def chunks():
+            try:
+                while True:
+                    yield b"chunk"
+            finally:
+                closed.set()
+        
+        def wsgi_application(environ, start_response):
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return chunks()
+        
+        loop = asyncio.get_event_loop()
+        disconnect = loop.create_future()
+        sent = []
+        received = []
+        
+        async def receive():
+            if not received:
+                received.append(True)
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnect
+            return {"type": "http.disconnect"}
+        
+        async def send(message):
+            sent.append(message)
+            
+            # the client goes away after a few chunks
+            if len(sent) == 3 and not disconnect.done():
+                disconnect.set_result(None)
+        
+        scope = {"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": []}
+        pool = ThreadPoolExecutor(1)
+        self.addCleanup(pool.shutdown)
+        handler = asgi.ThreadPoolASGIHandler(wsgi_application, pool)
+        loop.run_until_complete(asyncio.wait_for(handler(scope, receive, send), 5))
+        
+        # check the generator was closed and no end of response was sent
+        self.assertTrue(closed.wait(5))
+        self.assertTrue(all(message.get("more_body", True) for message in sent if message["type"] == "http.response.body"))
+        
+        
+    def test_asgi_async_content(self):
+        
+        """
+        This test ensures that the content of an AsyncContentResponse is produced on the event loop
+        """
+        
+        threads = []
+        
+        async def content():
+            for chunk in (b"first", b"second"):
+                threads.append(threading.current_thread())
+                await asyncio.sleep(0)
+                yield chunk
+        
+        def wsgi_application(environ, start_response):
+            self.assertTrue(environ["foodstock.async_content"])
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return AsyncContentResponse(content)
+        
+        loop = asyncio.get_event_loop()
+        messages = []
+        received = []
+        
+        async def receive():
+            if not received:
+                received.append(True)
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await loop.create_future()
+        
+        async def send(message):
+            messages.append(message)
+        
+        scope = {"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": []}
+        pool = ThreadPoolExecutor(1)
+        self.addCleanup(pool.shutdown)
+        loop.run_until_complete(asyncio.wait_for(asgi.ThreadPoolASGIHandler(wsgi_application, pool)(scope, receive, send), 5))
+        
+        # check response
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertEqual(b"".join(message.get("body", b"") for message in messages[1:]), b"firstsecond")
+        self.assertEqual(threads, [threading.main_thread()] * 2)
+        
+        
+class DatabaseProfileTest(APITestCase):
+    
+    def test_sqlite_pragmas(self):
+        
+        """
+        This test ensures that new SQLite connections are tuned with the configured pragmas
+        """
+        
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            synchronous = cursor.fetchone()[0]
+            cursor.execute("PRAGMA busy_timeout")
+            busy_timeout = cursor.fetchone()[0]
+        
+        # check pragmas, 1 is NORMAL
+        self.assertEqual(synchronous, 1)
+        self.assertEqual(busy_timeout, 20000)
+        
+    @override_settings(INVENTORY={'DB_HEALTH_CHECKS': True})
+    def test_broken_connection_closed(self):
+        
+        """
+        This test ensures that a broken persistent connection is closed when a request starts
+        """
+        
+        connection.ensure_connection()
+        with mock.patch.dict(connection.settings_dict, {"CONN_MAX_AGE": 60}), \
+                mock.patch.object(connection, "is_usable", return_value=False), \
+                mock.patch.object(connection, "close") as close:
+            check_connections(sender=None)
+        
+        # check the connection was closed
+        close.assert_called_once_with()
+
+
+
+class QueryCountTest(AuthenticatedViewTest):
+    
+    # Payload sizes stay under the batch sizes of the settings so every size runs the same statements
+    # The transaction of a write is a savepoint inside the test case one, which counts 2 more queries
+    payload_sizes = (1, 10, 50)
+    
+    def create_foods(self, size, prefix="food"):
+        return Food.objects.bulk_create([Food(user=self.user, name="{}{}-{}".format(prefix, size, idx), description="") for idx in range(size)])
+    
+    @staticmethod
+    def count_queries(queries):
+        
+        # The user row lock of the backends supporting SELECT ... FOR UPDATE is left out so the bounds hold on all of them
+        return len([query for query in queries if not query["sql"].endswith("FOR UPDATE")])
+    
+    def assertConstantQueries(self, prepare, max_queries):
+        """
+        Run the request returned by prepare(size) for every payload size and check that
+        the number of queries is the same for all of them and at most max_queries
+        """
+        counts = {}
+        for size in self.payload_sizes:
+            send = prepare(size)
+            with CaptureQueriesContext(connection) as queries:
+                response = send()
+            self.assertLess(response.status_code, 400, response.data)
+            counts[size] = self.count_queries(queries)
+        self.assertEqual(len(set(counts.values())), 1, "Queries grow with the payload size: {}".format(counts))
+        self.assertLessEqual(counts[self.payload_sizes[0]], max_queries, "Too many queries: {}".format(counts))
+    
+    def assertMaxQueries(self, send, max_queries):
+        """
+        Run the request of send and check that it takes at most max_queries
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = send()
+        self.assertLess(response.status_code, 400, getattr(response, "data", None))
+        self.assertLessEqual(self.count_queries(queries), max_queries, "Too many queries: {}".format(len(queries)))
+    
+    def test_list_queries(self):
+        
+        """
+        This test ensures that the number of queries of GET /food does not depend on the number of foods
+        """
+        
+        def prepare(size):
+            Food.objects.filter(user=self.user).delete()
+            self.create_foods(size)
+            
+            # foods created directly in the db don't invalidate the cached responses
+            caches['inventory'].clear()
+            return lambda: self.client.get(reverse("food-list"))
+        
+        # hit the API endpoint and check queries
+        self.assertConstantQueries(prepare, 2)
+        
+    def test_batch_create_queries(self):
+        
+        """
+        This test ensures that the number of queries of POST /food with a list does not depend on the number of foods
+        """
+        
+        def prepare(size):
+            data = [{"name": "new{}-{}".format(size, idx), "description": ""} for idx in range(size)]
+            return lambda: self.client.post(reverse("food-list"), data)
+        
+        # hit the API endpoint and check queries
+        self.assertConstantQueries(prepare, 6)
+        
+    def test_batch_update_queries(self):
+        
+        """
+        This test ensures that the number of queries of PUT and PATCH /food?many=true does not depend on the number of foods
+        """
+        
+        def prepare(size, partial):
+            foods = self.create_foods(size, "partial" if partial else "full")
+            ids = Food.objects.filter(user=self.user, name__in=[food.name for food in foods]).values_list("id", flat=True)
+            query = "?many=true&ids={}".format(",".join(str(food_id) for food_id in ids))
+            if partial:
+                data = [{"is_on_stock": True} for _ in ids]
+                return lambda: self.client.patch(reverse("food-list") + query, data)
+            data = [{"name": "updated{}-{}".format(size, food_id), "description": "updated"} for food_id in ids]
+            return lambda: self.client.put(reverse("food-list") + query, data)
+        
+        # hit the API endpoint and check queries
+        self.assertConstantQueries(lambda size: prepare(size, partial=False), 8)
+        self.assertConstantQueries(lambda size: prepare(size, partial=True), 7)
+        
+    def test_upsert_queries(self):
+        
+        """
+        This test ensures that the number of queries of POST /food/upsert does not depend on the number of foods
+        """
+        
+        def prepare(size):
+            existing = self.create_foods(size, "upsert")
+            data = [{"name": food.name, "description": "updated"} for food in existing]
+            data += [{"name": "upsert-new{}-{}".format(size, idx), "description": ""} for idx in range(size)]
+            return lambda: self.client.post(reverse("food-upsert"), data)
+        
+        # hit the API endpoint and check queries
+        self.assertConstantQueries(prepare, 11)
+        
+    def test_delete_list_queries(self):
+        
+        """
+        This test ensures that the number of queries of DELETE /food?ids= does not depend on the number of foods
+        """
+        
+        def prepare(size):
+            self.create_foods(size, "delete")
+            ids = Food.objects.filter(user=self.user).values_list("id", flat=True)
+            return lambda: self.client.delete(reverse("food-list") + "?ids={}".format(",".join(str(food_id) for food_id in ids)))
+        
+        # hit the API endpoint and check queries
+        self.assertConstantQueries(prepare, 6)
+        
+    def test_delete_all_queries(self):
+        
+        """
+        This test ensures that the number of queries of DELETE /food?clear=true does not depend on the number of foods
+        """
+        
+        def prepare(size):
+            self.create_foods(size)
+            return lambda: self.client.delete(reverse("food-list") + "?clear=true")
+        
+        # hit the API endpoint and check queries
+        self.assertConstantQueries(prepare, 5)
+        
+    def test_retrieve_queries(self):
+        
+        """
+        This test ensures that GET /food/:id reads the validators and the food with two queries
+        """
+        
+        food = Food.objects.create(user=self.user, name="tomato", description="")
+        
+        # hit the API endpoint and check queries
+        self.assertMaxQueries(lambda: self.client.get(reverse("food-detail", kwargs={"pk": food.id})), 2)
+        
+    def test_create_queries(self):
+        
+        """
+        This test ensures that the number of queries of a single POST /food stays bounded
+        """
+        
+        # hit the API endpoint and check queries
+        self.assertMaxQueries(lambda: self.client.post(reverse("food-list"), {"name": "tomato", "description": ""}), 5)
+        
+    def test_update_queries(self):
+        
+        """
+        This test ensures that the number of queries of PUT and PATCH /food/:id stays bounded
+        """
+        
+        food = Food.objects.create(user=self.user, name="tomato", description="")
+        url = reverse("food-detail", kwargs={"pk": food.id})
+        
+        # hit the API endpoint and check queries
+        self.assertMaxQueries(lambda: self.client.put(url, {"name": "ham", "description": "smoked"}), 6)
+        self.assertMaxQueries(lambda: self.client.patch(url, {"is_on_stock": True}), 5)
+        
+    def test_destroy_queries(self):
+        
+        """
+        This test ensures that the number of queries of DELETE /food/:id stays bounded
+        """
+        
+        food = Food.objects.create(user=self.user, name="tomato", description="")
+        
+        # hit the API endpoint and check queries
+        self.assertMaxQueries(lambda: self.client.delete(reverse("food-detail", kwargs={"pk": food.id})), 5)
+        
+    def test_stock_queries(self):
+        
+        """
+        This test ensures that PUT /food/:id/stock writes with a single UPDATE and that
+        the number of queries of PUT /food/stock?ids= does not depend on the number of foods
+        """
+        
+        food = Food.objects.create(user=self.user, name="tomato", description="")
+        
+        def prepare(size):
+            self.create_foods(size, "stock")
+            ids = Food.objects.filter(user=self.user, name__startswith="stock{}-".format(size)).values_list("id", flat=True)
+            
+            # a single id takes the path of PUT /food/:id/stock
+            query = "?ids={},{}".format(food.id, ",".join(str(food_id) for food_id in ids))
+            return lambda: self.client.put(reverse("food-stock-list") + query, {"is_on_stock": True})
+        
+        # hit the API endpoint and check queries
+        self.assertMaxQueries(lambda: self.client.put(reverse("food-stock", kwargs={"pk": food.id}), {"is_on_stock": True}), 4)
+        self.assertConstantQueries(prepare, 5)
+        
+    def test_changes_queries(self):
+        
+        """
+        This test ensures that a GET /food/changes long-poll without waiting reads the sync token once
+        """
+        
+        # hit the API endpoint and check queries
+        self.assertMaxQueries(lambda: self.client.get(reverse("food-changes") + "?since=0&timeout=0"), 1)
+        
+    def test_sync_queries(self):
+        
+        """
+        This test ensures that the number of queries of GET /food/sync does not depend on the number of changes
+        """
+        
+        def prepare(size):
+            token = self.client.get(reverse("food-sync")).data["token"]
+            data = [{"name": "sync{}-{}".format(size, idx), "description": ""} for idx in range(size)]
+            self.client.post(reverse("food-list"), data)
+            return lambda: self.client.get(reverse("food-sync") + "?since={}".format(token))
+        
+        # hit the API endpoint and check queries
+        self.assertConstantQueries(prepare, 2)
+
+
+@override_settings(INVENTORY={'INSTRUMENTATION': True})
+class InstrumentationTest(AuthenticatedViewTest):
+    
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+    
+    def test_server_timing(self):
+        
+        """
+        This test ensures that the phases of a request are sent in the Server-Timing header
+        """
+        
+        # hit the API endpoint
+        Food.objects.create(user=self.user, name="Tomato", description="")
+        response = self.client.get(reverse("food-list"))
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        phases = [metric.split(";")[0] for metric in response["Server-Timing"].split(", ")]
+        self.assertEqual(phases, ["auth", "db", "serialize", "render", "total"])
+        self.assertIn('desc="2 queries"', response["Server-Timing"])
+        
+    def test_metrics(self):
+        
+        """
+        This test ensures that the request histograms are served in the Prometheus format by the /metrics endpoint
+        """
+        
+        # hit the API endpoint
+        self.client.get(reverse("food-list"))
+        self.client.get(reverse("food-list"))
+        response = self.client.get(reverse("metrics"))
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        content = response.content.decode("utf-8")
+        self.assertIn('inventory_request_phase_seconds_count{view="food-list",phase="db"} 2', content)
+        self.assertIn('inventory_request_queries_bucket{view="food-list",le="+Inf"} 2', content)
+        self.assertIn('inventory_cache_hits_total{cache="response"}', content)
+        
+    @override_settings(INVENTORY={'INSTRUMENTATION': False})
+    def test_instrumentation_disabled(self):
+        
+        """
+        This test ensures that requests are not instrumented and /metrics is not served when instrumentation is disabled
+        """
+        
+        # hit the API endpoint
+        response = self.client.get(reverse("food-list"))
+        metrics_response = self.client.get(reverse("metrics"))
+        
+        # check response
+        self.assertFalse(response.has_header("Server-Timing"))
+        self.assertEqual(metrics_response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class FastJSONTest(AuthenticatedViewTest):
+    
+    def test_render_like_json_renderer(self):
+        
+        """
+        This test ensures that the fast renderer outputs the same bytes as DRF's JSONRenderer
+        """
+        
+        data = [
+            {"name": "tomato\u2028", "date_modified": timezone.now(), "is_on_stock": True, "user": 1, "id": 2, "description": "árvíztűrő"},
+            {"name": "ham", "date_modified": None, "is_on_stock": False, "user": 1, "id": 3, "description": ""},
+        ]
+        
+        # check output
+        self.assertEqual(FastJSONRenderer().render(data, "application/json"), JSONRenderer().render(data, "application/json"))
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=4"),
+            JSONRenderer().render(data, "application/json; indent=4")
+        )
+        
+    def test_parse_json(self):
+        
+        """
+        This test ensures that the API parses JSON bodies with the fast parser and rejects malformed ones
+        """
+        
+        # hit the API endpoint
+        response = self.client.post(reverse("food-list"), data=json.dumps({"name": "tomato", "description": ""}), content_type="application/json")
+        invalid_response = self.client.post(reverse("food-list"), data=b"[{\"name\": ", content_type="application/json")
+        
+        # check response
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(invalid_response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(b'{"a": [1, true, null]}')), {"a": [1, True, None]})
+
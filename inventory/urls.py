@@ -1,4 +1,5 @@
 from django.urls import path
+from rest_framework_jwt.views import refresh_jwt_token
 from .views import FoodViewSet, LoginView, RegisterUsers
 from .routers import CustomRouter
 
@@ -7,4 +8,5 @@ router.register(r'food', FoodViewSet)
 urls = router.urls
 urls.append(path('auth/login/', LoginView.as_view(), name="auth-login"))
 urls.append(path('auth/register/', RegisterUsers.as_view(), name="auth-register"))
+urls.append(path('auth/refresh/', refresh_jwt_token, name="auth-refresh"))
 urlpatterns = urls
\ No newline at end of file
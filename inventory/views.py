@@ -1,17 +1,41 @@
+import calendar
+import hashlib
+import math
+import time
+
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login
+from django.db import IntegrityError, connection
 from django.db.models import Model
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import quote_etag
 
 from rest_framework.response import Response
-from rest_framework.views import status
+from rest_framework.views import exception_handler as default_exception_handler, status
 from rest_framework import generics, permissions
 from rest_framework_jwt.settings import api_settings
 
+from .bulk import bulk_delete, bulk_upsert
+from .conf import inventory_setting
+from .filters import FoodFilterBackend
+from .hashers import UNAVAILABLE_MESSAGE, UNAVAILABLE_RETRY_AFTER, PasswordHashingUnavailable
+from .instrumentation import InstrumentedViewMixin
 from .models import Food
-from .serializers import FoodSerializer, TokenSerializer, UserSerializer
+from .notifications import async_wait_for_changes, inventory_changes, wait_for_changes
+from .pagination import FoodCursorPagination
+from .renderers import EventStreamRenderer, FastJSONRenderer, NDJSONRenderer, stream_json_array
+from .responses import AsyncContentResponse, async_content_supported
+from .stock import forget_stock, set_stock, stock_buffer
+from .sync import collect_changes, latest_token
+from .serializers import (
+    FoodFastSerializer, FoodSerializer, FoodUpsertSerializer, StockSerializer, TokenSerializer, UserSerializer,
+    requested_fields,
+)
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action
 from rest_framework.viewsets import ModelViewSet
-from .decorators import validate_for_list_update
+from .decorators import cached_response, conditional_get, invalid_ids_response, parse_ids, validate_for_list_update
 
 # Get the JWT settings
 jwt_payload_handler = api_settings.JWT_PAYLOAD_HANDLER
@@ -22,8 +46,8 @@ def update_object(view=ModelViewSet, model=Model, request=None, pk=None, partial
         an_object = view.get_queryset().get(pk=pk)
         updated_serializer = view.get_serializer(an_object, data=request.data, partial=partial)
         updated_serializer.is_valid(raise_exception=True)
-        updated_serializer.save()
-        return Response(updated_serializer.data)
+        food = updated_serializer.save()
+        return Response(FoodFastSerializer(food, fields=updated_serializer.context['fields']).data)
     except model.DoesNotExist:
         
         # Check for custom not found response on viewset
@@ -33,41 +57,152 @@ def update_object(view=ModelViewSet, model=Model, request=None, pk=None, partial
         
         # Send back default not found response
         return Response(data={"message": "{} with id: {} does not exist".format(model._meta.object_name, pk)}, status=status.HTTP_404_NOT_FOUND)
+
+def food_etag(request, *state):
+    """
+    Build an ETag from the requesting user, the requested representation and the data state
+    """
+    parts = (request.user.pk, request.get_full_path(), request.META.get('HTTP_ACCEPT', '')) + state
+    key = "|".join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(key.encode('utf-8')).hexdigest())
+
+def food_list_validators(view, request):
     
-class FoodViewSet(ModelViewSet):
+    # Every write of the user's foods moves the change token forward, including deletes of older rows
+    # The list has no Last-Modified since deletes don't show in the dates of the remaining foods
+    return food_etag(request, latest_token(request.user)), None
+
+def food_detail_validators(view, request, pk=None):
+    last_modified = view.get_queryset().filter(pk=pk).values_list('date_modified', flat=True).first()
+    if last_modified is None:
+        return None, None
+    return food_etag(request, pk, last_modified.isoformat()), calendar.timegm(last_modified.utctimetuple())
+    
+class FoodViewSet(InstrumentedViewMixin, ModelViewSet):
     
     """
     ViewSet for Food model
     GET food
+    GET food?page_size=100&cursor=...
+    GET food?stream=1
+    GET food/sync?since=:token
+    GET food/changes?since=:token&timeout=25
+    GET food?is_on_stock=false&name=tom&search=ato&modified_since=2018-09-10T08:39:00Z
     POST food
-    DELETE food
+    POST food/upsert
+    DELETE food?clear=true
+    DELETE food?ids=1,2,3
     PUT food
+    PUT food/stock?ids=1,2,3
     GET food/:id
     PUT food/:id
     PATCH food/:id
+    PUT food/:id/stock
     DELETE food/:id
     """
     queryset = Food.objects.none()
     serializer_class = FoodSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = FoodCursorPagination
+    filter_backends = (FoodFilterBackend,)
+    renderer_classes = tuple(ModelViewSet.renderer_classes) + (NDJSONRenderer, EventStreamRenderer)
     
     def get_queryset(self):
         if self.request.user.is_anonymous:
             return Food.objects.none()
         return Food.objects.filter(user=self.request.user)
     
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        
+        # Fields of the write responses, checked before anything is written
+        context['fields'] = requested_fields(self.request)
+        return context
+    
     def not_found_response(self, pk=None):
         return Response(data={"message": "Food with id: {} does not exist".format(pk)}, status=status.HTTP_404_NOT_FOUND)
     
+    def forget_stock(self, foods_data, ids=None):
+        """
+        Drop the buffered stock states of the foods whose data has an is_on_stock,
+        foods are matched on the ids when given, otherwise on their names
+        """
+        if ids is None:
+            names = [food_data['name'] for food_data in foods_data if 'is_on_stock' in food_data]
+            forget_stock(self.request.user, names=names)
+            return
+        forget_stock(self.request.user, [food_id for food_id, food_data in zip(ids, foods_data) if 'is_on_stock' in food_data])
+    
+    def inventory_changes(self):
+        """
+        Wraps the writes of every write endpoint, the written ids are added to the yielded changes
+        """
+        return inventory_changes(self.request.user)
+    
+    def bulk_create(self, validated_data):
+        """
+        Insert all foods in chunked multi-row INSERTs, called in the transaction of inventory_changes
+        """
+        batch_size = inventory_setting('BULK_CREATE_BATCH_SIZE')
+        foods = [Food(user=self.request.user, **food_data) for food_data in validated_data]
+        foods = Food.objects.bulk_create(foods, batch_size=batch_size)
+        
+        # Backends returning the new ids already filled in the objects
+        if connection.features.can_return_ids_from_bulk_insert:
+            return foods
+        
+        # Otherwise fetch the rows back by name which is unique per user
+        names = [food.name for food in foods]
+        results = []
+        for start in range(0, len(names), batch_size):
+            chunk = self.get_queryset().filter(name__in=names[start:start + batch_size]).order_by('id')
+            results.extend(chunk)
+        return results
+    
     """
     Endpoints
     """
     
+    @conditional_get(food_list_validators)
     def list(self, request):
         
+        # GET /food?stream=1 or GET /food with Accept: application/x-ndjson
+        if self.is_stream_requested(request):
+            return self.stream_list(request)
+        
         # GET /food
-        food_list = self.serializer_class(self.get_queryset(), many=True)
+        return self.food_list(request)
+    
+    @cached_response
+    def food_list(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = requested_fields(request)
+        if fields is not None:
+            
+            # The cursor of the next page is built from date_modified and id
+            queryset = queryset.only(*set(fields) | {'date_modified', 'id'})
+        
+        # Keyset pagination is only applied when the client asks for it
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            food_list = FoodFastSerializer(page, many=True, fields=fields)
+            return self.get_paginated_response(food_list.data)
+        
+        food_list = FoodFastSerializer(queryset, many=True, fields=fields)
         return Response(food_list.data, status=status.HTTP_200_OK)
+    
+    def is_stream_requested(self, request):
+        return request.query_params.get('stream') in ('1', 'true') or isinstance(request.accepted_renderer, NDJSONRenderer)
+    
+    def stream_list(self, request):
+        """
+        Send the foods in encoded chunks so memory use does not grow with the inventory
+        """
+        food_list = FoodFastSerializer(self.filter_queryset(self.get_queryset()), fields=requested_fields(request))
+        chunks = food_list.iter_chunks(inventory_setting('STREAM_CHUNK_SIZE'))
+        if isinstance(request.accepted_renderer, NDJSONRenderer):
+            return StreamingHttpResponse(request.accepted_renderer.stream(chunks), content_type=NDJSONRenderer.media_type)
+        return StreamingHttpResponse(stream_json_array(chunks), content_type='application/json')
 
     def create(self, request):
         
@@ -77,8 +212,10 @@ class FoodViewSet(ModelViewSet):
             # Single object creation
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
-            new_food = Food.objects.create(user=request.user, name=request.data["name"])
-            return Response(data=FoodSerializer(new_food).data, status=status.HTTP_201_CREATED)
+            with self.inventory_changes() as changes:
+                new_food = Food.objects.create(user=request.user, name=request.data["name"])
+                changes.created.append(new_food.id)
+            return Response(data=FoodFastSerializer(new_food, fields=serializer.context['fields']).data, status=status.HTTP_201_CREATED)
         
         
         # List creation
@@ -96,61 +233,100 @@ class FoodViewSet(ModelViewSet):
 #                 status=status.HTTP_400_BAD_REQUEST
 #             )
 
-        food_created = []
-        for list_elt in request.data:
-            food_obj = Food.objects.create(user=request.user, **list_elt)
-            food_created.append(food_obj.id)
-        results = Food.objects.filter(id__in=food_created)
-        output_serializer = FoodSerializer(results, many=True)
-        data = output_serializer.data[:]
-        return Response(data, status=status.HTTP_201_CREATED)
+        with self.inventory_changes() as changes:
+            results = self.bulk_create(serializer.validated_data)
+            changes.created.extend(food.id for food in results)
+        output_serializer = FoodFastSerializer(results, many=True, fields=serializer.context['fields'])
+        return Response(output_serializer.data, status=status.HTTP_201_CREATED)
     
+    @conditional_get(food_detail_validators)
     def retrieve(self, request, pk=None):
         
         # GET /food/:id
-        try:
-            a_food = self.get_queryset().get(pk=pk)
-            return Response(self.serializer_class(a_food).data, status=status.HTTP_200_OK)
-        except Food.DoesNotExist:
-            return self.not_found_response(pk=pk) 
+        food_list = FoodFastSerializer(self.get_queryset().filter(pk=pk), many=True, fields=requested_fields(request)).data
+        if not food_list:
+            return self.not_found_response(pk=pk)
+        return Response(food_list[0], status=status.HTTP_200_OK)
 
     def update(self, request, pk=None):
         
         # PUT /food/:id
-        return update_object(self, Food, request, pk)
+        if pk.isdigit():
+            self.forget_stock([request.data], [int(pk)])
+        with self.inventory_changes() as changes:
+            response = update_object(self, Food, request, pk)
+            if response.status_code == status.HTTP_200_OK:
+                changes.updated.append(int(pk))
+        return response
         
     def partial_update(self, request, pk=None):
         
         # PATCH /food/:id
-        return update_object(self, Food, request, pk, partial=True)
+        if pk.isdigit():
+            self.forget_stock([request.data], [int(pk)])
+        with self.inventory_changes() as changes:
+            response = update_object(self, Food, request, pk, partial=True)
+            if response.status_code == status.HTTP_200_OK:
+                changes.updated.append(int(pk))
+        return response
 
     def destroy(self, request, pk=None):
         
         # DELETE /food/:id
         try:
-            a_food = self.get_queryset().get(pk=pk)
-            a_food.delete()
+            with self.inventory_changes() as changes:
+                a_food = self.get_queryset().get(pk=pk)
+                food_id = a_food.id
+                a_food.delete()
+                changes.deleted.append(food_id)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Food.DoesNotExist:
             return self.not_found_response(pk=pk)
         
     def delete_all(self, request):
         
-        # GET /food?clear=true
+        # DELETE /food?ids=1,2,3
+        if 'ids' in request.query_params:
+            return self.delete_list(request)
+        
+        # DELETE /food?clear=true
         if 'clear' in request.query_params:
             if request.query_params["clear"]:
-                self.get_queryset().delete()
+                with self.inventory_changes() as changes:
+                    bulk_delete(self.get_queryset())
+                    changes.cleared = True
                 return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
     
+    def delete_list(self, request):
+        """
+        Delete the user's foods of the "ids" query param, unknown ids are ignored
+        """
+        ids = parse_ids(request)
+        if ids is None:
+            return invalid_ids_response()
+        
+        # Select the ids first to report the foods actually deleted
+        batch_size = inventory_setting('BULK_UPDATE_BATCH_SIZE')
+        with self.inventory_changes() as changes:
+            for start in range(0, len(ids), batch_size):
+                existing = list(self.get_queryset().filter(id__in=ids[start:start + batch_size]).values_list('id', flat=True))
+                if existing:
+                    bulk_delete(Food.objects.filter(id__in=existing))
+                    changes.deleted.extend(existing)
+        return Response({"deleted": changes.deleted})
+    
     @validate_for_list_update
     def update_list(self, request):
         
         # PUT /food?many=true&ids=1,2,3
         serializer = self.get_serializer(data=request.data, many=True, partial=False)
         serializer.is_valid(raise_exception=True)
-        ids = request.query_params['ids'].split(',')
-        updated_data = serializer.update(ids, request.data)
+        ids = parse_ids(request)
+        self.forget_stock(serializer.validated_data, ids)
+        with self.inventory_changes() as changes:
+            updated_data = serializer.update(ids, serializer.validated_data)
+            changes.updated.extend(ids)
         return Response(updated_data)
     
     @validate_for_list_update
@@ -159,11 +335,248 @@ class FoodViewSet(ModelViewSet):
         # PATCH /food?many=true&ids=1,2,3
         serializer = self.get_serializer(data=request.data, many=True, partial=True)
         serializer.is_valid(raise_exception=True)
-        ids = request.query_params['ids'].split(',')
-        updated_data = serializer.update(ids, request.data)
+        ids = parse_ids(request)
+        self.forget_stock(serializer.validated_data, ids)
+        with self.inventory_changes() as changes:
+            updated_data = serializer.update(ids, serializer.validated_data)
+            changes.updated.extend(ids)
         return Response(updated_data)
 
-class LoginView(generics.CreateAPIView):
+    @action(detail=False, methods=['post'], url_path='upsert')
+    def upsert(self, request):
+        
+        # POST /food/upsert
+        if not isinstance(request.data, list):
+            return Response(data={"message": "Expected a list of foods"}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = FoodUpsertSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        if not serializer.validated_data:
+            return Response({"created": 0, "updated": 0})
+        
+        # Foods are matched on the (user, name) unique constraint
+        now = timezone.now()
+        foods = [Food(user=request.user, date_modified=now, **food_data) for food_data in serializer.validated_data]
+        update_fields = list(serializer.validated_data[0]) + ['date_modified']
+        self.forget_stock(serializer.validated_data)
+        try:
+            with self.inventory_changes() as changes:
+                created, updated = bulk_upsert(
+                    self.get_queryset(), foods, ('user', 'name'), update_fields,
+                    batch_size=inventory_setting('BULK_CREATE_BATCH_SIZE')
+                )
+                changes.created.extend(created)
+                changes.updated.extend(updated)
+        except IntegrityError:
+            
+            # Another request created one of the names between the select and the insert
+            return Response(data={"message": "Foods were changed by another request, please retry"}, status=status.HTTP_409_CONFLICT)
+        return Response({"created": len(created), "updated": len(updated)})
+
+    @action(detail=True, methods=['put'], url_path='stock')
+    def stock(self, request, pk=None):
+        
+        # PUT /food/:id/stock
+        serializer = StockSerializer(data=request.data)
+        if not serializer.is_valid():
+            return invalid_stock_response()
+        if not pk.isdigit():
+            return self.not_found_response(pk=pk)
+        food_id = int(pk)
+        is_on_stock = serializer.validated_data['is_on_stock']
+        data = {"id": food_id, "is_on_stock": is_on_stock}
+        
+        buffer = stock_buffer()
+        if buffer is not None:
+            if not self.get_queryset().filter(pk=food_id).exists():
+                return self.not_found_response(pk=pk)
+            buffer.add(request.user, {food_id: is_on_stock})
+            return Response(data, status=status.HTTP_202_ACCEPTED)
+        
+        # Nothing changed either because the food already has this state or because it does not exist
+        if not set_stock(request.user, {food_id: is_on_stock}) and not self.get_queryset().filter(pk=food_id).exists():
+            return self.not_found_response(pk=pk)
+        return Response(data)
+    
+    @action(detail=False, methods=['put'], url_path='stock', url_name='stock-list')
+    def stock_list(self, request):
+        
+        # PUT /food/stock?ids=1,2,3, unknown ids are ignored
+        serializer = StockSerializer(data=request.data)
+        if not serializer.is_valid():
+            return invalid_stock_response()
+        ids = parse_ids(request)
+        if ids is None:
+            return invalid_ids_response()
+        is_on_stock = serializer.validated_data['is_on_stock']
+        
+        buffer = stock_buffer()
+        if buffer is not None:
+            batch_size = inventory_setting('BULK_UPDATE_BATCH_SIZE')
+            existing = []
+            for start in range(0, len(ids), batch_size):
+                existing.extend(self.get_queryset().filter(id__in=ids[start:start + batch_size]).values_list('id', flat=True))
+            buffer.add(request.user, {food_id: is_on_stock for food_id in existing})
+            return Response({"pending": existing}, status=status.HTTP_202_ACCEPTED)
+        return Response({"updated": set_stock(request.user, {food_id: is_on_stock for food_id in ids})})
+
+    @action(detail=False, methods=['get'], url_path='sync')
+    def sync(self, request):
+        
+        # GET /food/sync?since=:token
+        since = request.query_params.get('since', '')
+        if not since:
+            return self.full_sync()
+        
+        if not since.isdigit():
+            return Response(data={"message": "\"since\" should be a token returned by a previous sync"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        changes = collect_changes(request.user, int(since))
+        if changes is None:
+            
+            # The changes after the token were compacted away
+            return self.full_sync()
+        token, cleared, created, updated, deleted = changes
+        foods = {}
+        if created or updated:
+            foods = {food["id"]: food for food in FoodFastSerializer(self.get_queryset().filter(id__in=created + updated), many=True).data}
+        return Response({
+            "token": token,
+            "cleared": cleared,
+            "created": [foods[food_id] for food_id in created if food_id in foods],
+            "updated": [foods[food_id] for food_id in updated if food_id in foods],
+            "deleted": deleted,
+        })
+    
+    def full_sync(self):
+        """
+        Send the whole inventory to replace the client's data
+        """
+        return Response({
+            "token": latest_token(self.request.user),
+            "cleared": True,
+            "created": FoodFastSerializer(self.get_queryset(), many=True).data,
+            "updated": [],
+            "deleted": [],
+        })
+
+    @action(detail=False, methods=['get'], url_path='changes')
+    def changes(self, request):
+        
+        # GET /food/changes?since=:token&timeout=25, with Accept: text/event-stream for Server-Sent Events
+        since = request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('since', '')
+        if not since:
+            since = latest_token(request.user)
+        elif not since.isdigit():
+            return Response(data={"message": "\"since\" should be a token returned by a previous sync"}, status=status.HTTP_400_BAD_REQUEST)
+        since = int(since)
+        
+        max_timeout = inventory_setting('LONG_POLL_TIMEOUT')
+        try:
+            timeout = float(request.query_params.get('timeout', max_timeout))
+        except ValueError:
+            timeout = None
+        
+        # nan and inf would make the wait never end
+        if timeout is None or not math.isfinite(timeout):
+            return Response(data={"message": "\"timeout\" should be a number of seconds"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if isinstance(request.accepted_renderer, EventStreamRenderer):
+            return self.stream_changes(request, since)
+        
+        timeout = min(max(timeout, 0), max_timeout)
+        if timeout and async_content_supported(request) and isinstance(request.accepted_renderer, FastJSONRenderer):
+            return self.deferred_changes(request, since, timeout)
+        token = wait_for_changes(request.user, since, timeout, request.META.get('foodstock.disconnected'))
+        return Response({"token": token, "changed": token > since})
+    
+    def deferred_changes(self, request, since, timeout):
+        """
+        Answer the long-poll from the event loop so the waiting client holds no thread
+        """
+        renderer = request.accepted_renderer
+        media_type = request.accepted_media_type
+        user = request.user
+        
+        async def content():
+            token = await async_wait_for_changes(user, since, timeout)
+            yield renderer.render({"token": token, "changed": token > since}, media_type)
+        
+        return AsyncContentResponse(content, content_type=renderer.media_type)
+    
+    def stream_changes(self, request, since):
+        """
+        Send an event whenever the user's foods change until EVENT_STREAM_DURATION elapses
+        or the client disconnects, which the ASGI handler reports through the environ
+        The events are produced on the event loop when the server supports it
+        """
+        renderer = request.accepted_renderer
+        user = request.user
+        keep_alive = inventory_setting('LONG_POLL_TIMEOUT')
+        deadline = time.monotonic() + inventory_setting('EVENT_STREAM_DURATION')
+        disconnected = request.META.get('foodstock.disconnected')
+        
+        def event(token, new_token):
+            if new_token > token:
+                return renderer.render_event({"token": new_token}, event="change", event_id=new_token)
+            return b": keep-alive\n\n"
+        
+        def events():
+            token = since
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                new_token = wait_for_changes(user, token, min(keep_alive, remaining), disconnected)
+                if disconnected is not None and disconnected.is_set():
+                    return
+                yield event(token, new_token)
+                token = max(token, new_token)
+        
+        async def async_events():
+            token = since
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                new_token = await async_wait_for_changes(user, token, min(keep_alive, remaining))
+                yield event(token, new_token)
+                token = max(token, new_token)
+        
+        if async_content_supported(request):
+            response = AsyncContentResponse(async_events, content_type=EventStreamRenderer.media_type)
+        else:
+            response = StreamingHttpResponse(events(), content_type=EventStreamRenderer.media_type)
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+def invalid_stock_response():
+    
+    # The stock endpoints only take the new state
+    return Response(data={"message": "\"is_on_stock\" should be true or false"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def hashing_unavailable_response():
+    
+    # Password hashing pool is saturated, ask the client to come back later
+    return Response(
+        data={"message": UNAVAILABLE_MESSAGE},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(UNAVAILABLE_RETRY_AFTER)}
+    )
+
+
+def exception_handler(exc, context):
+    """
+    DRF exception handler answering a saturated password hashing pool with a 503 on every API view,
+    so api-token-auth/ and Basic authentication are covered like the login
+    """
+    if isinstance(exc, PasswordHashingUnavailable):
+        return hashing_unavailable_response()
+    return default_exception_handler(exc, context)
+
+
+class LoginView(InstrumentedViewMixin, generics.CreateAPIView):
     """
     POST auth/login/
     """
@@ -178,9 +591,11 @@ class LoginView(generics.CreateAPIView):
         password = request.data.get("password", "")
         user = authenticate(request, username=username, password=password)
         if user is not None:
-            # login saves the user’s ID in the session,
-            # using Django’s session framework.
-            login(request, user)
+            if not inventory_setting('STATELESS_LOGIN'):
+                
+                # login saves the user’s ID in the session,
+                # using Django’s session framework.
+                login(request, user)
             serializer = TokenSerializer(data={
                 # using drf jwt utility functions to generate a token
                 "token": jwt_encode_handler(
@@ -191,7 +606,7 @@ class LoginView(generics.CreateAPIView):
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
 
-class RegisterUsers(generics.CreateAPIView):
+class RegisterUsers(InstrumentedViewMixin, generics.CreateAPIView):
     """
     POST auth/register/
     """